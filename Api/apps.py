@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Api'
+
+    def ready(self):
+        from Api import metrics, objectcache, responsecache  # noqa: F401
+        objectcache.connect_signals()
+        responsecache.connect_signals()
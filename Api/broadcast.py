@@ -0,0 +1,269 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    '''The event loop broadcasts are coalesced and queued in, running in a daemon thread'''
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='graphql-broadcast', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+# The event loop the websocket consumers of this process run in, see attach().
+_consumer_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def attach(loop: asyncio.AbstractEventLoop) -> None:
+    """Send broadcasts from `loop`, the event loop running the consumers.
+
+    InMemoryChannelLayer hands messages to consumers through asyncio
+    queues, which only wake a waiting consumer when written to from the
+    consumer's own loop. Called by ApiConsumer when a client connects.
+    """
+    global _consumer_loop
+    _consumer_loop = loop
+
+
+async def send(subscription, group: str, payload: Dict[str, Any]) -> None:
+    '''subscription.broadcast_async(), run in the loop of the consumers when one has been attached'''
+    loop = _consumer_loop
+    if loop is None or not loop.is_running() or loop is asyncio.get_running_loop():
+        await subscription.broadcast_async(group=group, payload=payload)
+        return
+    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+        subscription.broadcast_async(group=group, payload=payload), loop))
+
+
+def merge(pending: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold `update` into `pending`.
+
+    Keys ending in `_delta` are summed, as are the values of nested dicts,
+    lists are concatenated (keeping the last `MAX_ITEMS`), and anything
+    else is replaced by the newer value.
+    """
+    for key, value in update.items():
+        previous = pending.get(key)
+        if previous is None:
+            pending[key] = dict(value) if isinstance(value, dict) else value
+        elif key.endswith('_delta') or isinstance(value, dict):
+            if isinstance(value, dict):
+                for item, delta in value.items():
+                    previous[item] = previous.get(item, 0) + delta
+            else:
+                pending[key] = previous + value
+        elif isinstance(value, list):
+            pending[key] = (previous + value)[-Coalescer.MAX_ITEMS:]
+        else:
+            pending[key] = value
+    return pending
+
+
+class Coalescer:
+    """Coalesces subscription broadcasts per group.
+
+    The first payload published to a group opens a window of `window`
+    seconds; everything published to the group during the window is merged
+    into a single broadcast sent when it closes. Windows are timed in
+    `loop`, or in `background_loop()` when no loop is given, so publishing
+    never blocks the request; broadcasts are sent with `send`.
+    """
+    MAX_ITEMS = 20
+
+    def __init__(self, window: float, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.window = window
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[type, Hashable], Dict[str, Any]] = {}
+        self.published = 0
+        self.sent = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = background_loop()
+        return self._loop
+
+    def publish(self, subscription, group: str, payload: Dict[str, Any]) -> None:
+        key = (subscription, group)
+        with self._lock:
+            self.published += 1
+            opened = key not in self._pending
+            self._pending[key] = merge(self._pending.get(key, {}), payload)
+        if opened:
+            loop = self.loop
+            loop.call_soon_threadsafe(loop.call_later, self.window, self._flush, key)
+
+    def _flush(self, key) -> None:
+        with self._lock:
+            payload = self._pending.pop(key, None)
+        if payload is not None:
+            self.loop.create_task(self._send(key, payload))
+
+    async def _send(self, key, payload) -> None:
+        subscription, group = key
+        try:
+            await send(subscription, group, payload)
+            self.sent += 1
+        except Exception:
+            logger.exception('Broadcast to %s failed', group)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'published': self.published, 'sent': self.sent, 'pending': len(self._pending)}
+
+
+class Batcher:
+    """Sends subscription broadcasts in batches from a background task.
+
+    Events are queued as they are published and taken `batch_size` at a
+    time. The groups of a batch are sent to concurrently, but each group's
+    events are sent with `send` one after the other, so a group never has
+    more than one broadcast in flight and a subscriber's
+    notification_queue_limit is not overrun by a single batch. Unlike
+    Coalescer nothing is merged, though a subscriber slower than the rate
+    of events still drops the oldest ones from its queue. Once `max_queue`
+    events are waiting, `put` drops new events and `put_async` waits for
+    room.
+    """
+
+    def __init__(self, batch_size=100, max_queue=10000, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._loop = loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._started = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.sent = 0
+        self.batches = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = background_loop()
+        return self._loop
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        '''The event queue, starting the sender task on first use'''
+        if self._queue is None:
+            with self._started:
+                if self._queue is None:
+                    ready = concurrent.futures.Future()
+                    if self._in_loop():
+                        self._start(ready)
+                    else:
+                        self.loop.call_soon_threadsafe(self._start, ready)
+                        ready.result()
+        return self._queue
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _start(self, ready) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self.loop.create_task(self._run())
+        ready.set_result(None)
+
+    def _put(self, queue, event) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def put(self, subscription, group: str, payload: Dict[str, Any]) -> None:
+        queue = self.queue
+        self.published += 1
+        if self._in_loop():
+            self._put(queue, (subscription, group, payload))
+        else:
+            self.loop.call_soon_threadsafe(self._put, queue, (subscription, group, payload))
+
+    async def put_async(self, subscription, group: str, payload: Dict[str, Any]) -> None:
+        queue = self.queue
+        self.published += 1
+        if self._in_loop():
+            await queue.put((subscription, group, payload))
+        else:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                queue.put((subscription, group, payload)), self.loop))
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            groups: Dict[Tuple[type, str], list] = {}
+            for subscription, group, payload in batch:
+                groups.setdefault((subscription, group), []).append(payload)
+            await asyncio.gather(*[
+                self._send_group(subscription, group, payloads) for (subscription, group), payloads in groups.items()
+            ])
+            self.batches += 1
+            for _ in batch:
+                queue.task_done()
+
+    async def _send_group(self, subscription, group, payloads) -> None:
+        for payload in payloads:
+            try:
+                await send(subscription, group, payload)
+                self.sent += 1
+            except Exception:
+                logger.exception('Broadcast to %s failed', group)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        '''Wait until every event queued so far has been sent'''
+        asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop).result(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'published': self.published, 'sent': self.sent, 'dropped': self.dropped,
+            'batches': self.batches, 'pending': self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+class BatchedBroadcast:
+    """Subscription mixin adding non-blocking broadcasts through `batcher`.
+
+    `enqueue` can be called from sync code and returns at once,
+    `enqueue_async` only waits when the queue is full.
+    """
+
+    @classmethod
+    def enqueue(cls, group: str, payload: Dict[str, Any]) -> None:
+        batcher.put(cls, group, payload)
+
+    @classmethod
+    async def enqueue_async(cls, group: str, payload: Dict[str, Any]) -> None:
+        await batcher.put_async(cls, group, payload)
+
+
+coalescer = Coalescer(getattr(settings, 'GRAPHQL_BROADCAST_WINDOW', 0.25))
+batcher = Batcher(**getattr(settings, 'GRAPHQL_BROADCAST_BATCH', {}))
+
+
+def publish(subscription, group: str, payload: Dict[str, Any]) -> None:
+    '''Broadcast `payload` to `group` once the current transaction commits'''
+    transaction.on_commit(lambda: coalescer.publish(subscription, group, payload))
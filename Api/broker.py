@@ -0,0 +1,146 @@
+"""A small message broker for Api.layers.BrokerChannelLayer.
+
+Every worker process opens one TCP connection to the broker and registers
+the prefix of its process-specific channels. Group memberships live in the
+broker, so a group send is routed once to each worker holding members of
+the group, however many members it holds, and the worker delivers it to its
+local channels. Memberships of a worker are dropped when its connection
+closes, so no expiry is needed.
+
+Frames are `!IBH` (body length, flags, header length) followed by a JSON
+header and the message body. Bodies are JSON, zlib compressed when the
+COMPRESSED flag is set, and are forwarded by the broker without decoding.
+"""
+import asyncio
+import base64
+import json
+import logging
+import struct
+import zlib
+from collections import defaultdict
+from typing import Dict, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+FRAME = struct.Struct('!IBH')
+COMPRESSED = 1
+# Messages to a worker whose socket buffer is over this are dropped rather
+# than queued, so a stalled worker cannot hold up everyone else.
+MAX_WRITE_BUFFER = 16 * 1024 * 1024
+
+
+def _default(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'{type(value).__name__} is not serializable')
+
+
+def _object_hook(value):
+    if len(value) == 1 and '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+    return value
+
+
+def encode_message(message, threshold=1024, level=1) -> Tuple[int, bytes]:
+    body = json.dumps(message, default=_default, separators=(',', ':')).encode('utf-8')
+    if threshold is not None and len(body) >= threshold:
+        return COMPRESSED, zlib.compress(body, level)
+    return 0, body
+
+
+def decode_message(flags: int, body: bytes):
+    if flags & COMPRESSED:
+        body = zlib.decompress(body)
+    return json.loads(body, object_hook=_object_hook)
+
+
+def pack(header: dict, flags: int = 0, body: bytes = b'') -> bytes:
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return FRAME.pack(len(body), flags, len(encoded)) + encoded + body
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    length, flags, header_length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    header = json.loads(await reader.readexactly(header_length))
+    body = await reader.readexactly(length) if length else b''
+    return header, flags, body
+
+
+def route_of(channel: str) -> str:
+    '''The worker prefix a process-specific channel belongs to'''
+    return channel.split('!', 1)[0].rsplit('.', 1)[-1]
+
+
+class Broker:
+    def __init__(self):
+        self.workers: Dict[str, asyncio.StreamWriter] = {}
+        self.groups: Dict[str, Set[str]] = defaultdict(set)
+        self.memberships: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        self.stats = defaultdict(int)
+
+    def deliver(self, route, channels, flags, body):
+        writer = self.workers.get(route)
+        if writer is None or writer.is_closing():
+            self.stats['undeliverable'] += 1
+            return
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.stats['dropped'] += 1
+            return
+        writer.write(pack({'op': 'deliver', 'channels': channels}, flags, body))
+        self.stats['delivered'] += 1
+
+    def handle_frame(self, route, header, flags, body):
+        op = header['op']
+        if op == 'group_add':
+            group, channel = header['group'], header['channel']
+            self.groups[group].add(channel)
+            self.memberships[route_of(channel)].add((group, channel))
+        elif op == 'group_discard':
+            group, channel = header['group'], header['channel']
+            self.groups[group].discard(channel)
+            self.memberships[route_of(channel)].discard((group, channel))
+            if not self.groups[group]:
+                del self.groups[group]
+        elif op == 'send':
+            self.stats['sends'] += 1
+            self.deliver(route_of(header['channel']), [header['channel']], flags, body)
+        elif op == 'group_send':
+            self.stats['group_sends'] += 1
+            routes = defaultdict(list)
+            for channel in self.groups.get(header['group'], ()):
+                routes[route_of(channel)].append(channel)
+            for target, channels in routes.items():
+                self.deliver(target, channels, flags, body)
+
+    def forget(self, route):
+        for group, channel in self.memberships.pop(route, ()):
+            members = self.groups.get(group)
+            if members is not None:
+                members.discard(channel)
+                if not members:
+                    del self.groups[group]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        route = None
+        try:
+            while True:
+                header, flags, body = await read_frame(reader)
+                if header['op'] == 'hello':
+                    route = header['route']
+                    self.workers[route] = writer
+                else:
+                    self.handle_frame(route, header, flags, body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception('Broker connection failed')
+        finally:
+            if route is not None and self.workers.get(route) is writer:
+                del self.workers[route]
+                self.forget(route)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=6390):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
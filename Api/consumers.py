@@ -1,10 +1,22 @@
+import asyncio
 import json
 import channels_graphql_ws
 from channels.generic.websocket import WebsocketConsumer
+from Api import broadcast
+from Api.metrics import websocket_connections
 from Api.schema import schema
 
 
 class ApiConsumer(channels_graphql_ws.GraphqlWsConsumer):
     """GraphQL WebSocket consumer."""
 
-    schema = schema
\ No newline at end of file
+    schema = schema
+
+    async def connect(self):
+        websocket_connections.inc(event='open')
+        broadcast.attach(asyncio.get_running_loop())
+        await super().connect()
+
+    async def disconnect(self, code):
+        websocket_connections.inc(event='close')
+        await super().disconnect(code)
\ No newline at end of file
@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLObjectType,
+    OperationDefinitionNode,
+    get_named_type,
+    get_nullable_type,
+    value_from_ast_untyped,
+)
+
+COST = {
+    'MAX_COST': 20000,
+    'MAX_DEPTH': 12,
+    'LIST_SIZE': 20,
+    'THROTTLE_RATE': None,
+    'THROTTLE_WINDOW': 60,
+    **getattr(settings, 'GRAPHQL_QUERY_COST', {}),
+}
+
+
+class QueryCostError(GraphQLError):
+    """Raised when a query is rejected before execution because of its cost."""
+
+    def __init__(self, message, code, **extensions):
+        super().__init__(message, extensions={'code': code, **extensions})
+
+
+@dataclass
+class QueryCost:
+    cost: int
+    depth: int
+
+    def as_extension(self) -> Dict[str, Any]:
+        return {'requested': self.cost, 'depth': self.depth, 'budget': COST['MAX_COST']}
+
+
+def is_connection(graphql_type) -> bool:
+    return isinstance(graphql_type, GraphQLObjectType) and 'edges' in graphql_type.fields and 'pageInfo' in graphql_type.fields
+
+
+class CostAnalyzer:
+    """Estimates how many objects an operation can return before running it.
+
+    Every object field costs one, times the size of the lists it is nested
+    in. Connections count as `first` or `last` objects, or
+    RELAY_CONNECTION_MAX_LIMIT without either; other lists of objects
+    count as LIST_SIZE. Scalars and introspection fields are free.
+    """
+
+    def __init__(self, schema, document, variables: Optional[Dict[str, Any]]):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition for definition in document.definitions
+            if not isinstance(definition, OperationDefinitionNode)
+        }
+        self.max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+    def analyze(self, operation: OperationDefinitionNode) -> QueryCost:
+        root = self.schema.get_root_type(operation.operation)
+        return QueryCost(*self.selection_cost(root, operation.selection_set, 0))
+
+    def page_size(self, node: FieldNode) -> int:
+        arguments = {
+            argument.name.value: value_from_ast_untyped(argument.value, self.variables)
+            for argument in node.arguments or ()
+        }
+        sizes = [arguments[name] for name in ('first', 'last') if isinstance(arguments.get(name), int)]
+        return min(max(sizes), self.max_limit) if sizes else self.max_limit
+
+    def selection_cost(self, parent_type, selection_set, depth):
+        cost, deepest = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                if name.startswith('__') or selection.selection_set is None:
+                    continue
+                field = parent_type.fields[name]
+                field_type = get_nullable_type(field.type)
+                named_type = get_named_type(field_type)
+                if is_connection(named_type):
+                    size = self.page_size(selection)
+                elif isinstance(field_type, GraphQLList) and not is_connection(parent_type):
+                    size = COST['LIST_SIZE']
+                else:
+                    size = 1
+                children, child_depth = self.selection_cost(named_type, selection.selection_set, depth + 1)
+                cost += size * (1 + children)
+                deepest = max(deepest, child_depth)
+            else:
+                if isinstance(selection, FragmentSpreadNode):
+                    fragment = self.fragments[selection.name.value]
+                else:
+                    fragment = selection
+                condition = fragment.type_condition
+                fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+                if not hasattr(fragment_type, 'fields'):
+                    fragment_type = parent_type
+                children, child_depth = self.selection_cost(fragment_type, fragment.selection_set, depth)
+                cost += children
+                deepest = max(deepest, child_depth)
+        return cost, deepest
+
+
+def throttle_key(request) -> str:
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'graphql-cost:user:{user.pk}'
+    return f'graphql-cost:ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def check_query_cost(request, schema, document, operation, variables) -> QueryCost:
+    '''Estimate the cost of `operation`, raising QueryCostError when it is over budget'''
+    query_cost = CostAnalyzer(schema, document, variables).analyze(operation)
+    if query_cost.depth > COST['MAX_DEPTH']:
+        raise QueryCostError(
+            f'Query is nested {query_cost.depth} levels deep, the limit is {COST["MAX_DEPTH"]}.',
+            'QUERY_TOO_DEEP', depth=query_cost.depth, limit=COST['MAX_DEPTH'],
+        )
+    if query_cost.cost > COST['MAX_COST']:
+        raise QueryCostError(
+            f'Query may return up to {query_cost.cost} objects, the limit is {COST["MAX_COST"]}. '
+            'Ask for smaller pages or fewer nested connections.',
+            'QUERY_TOO_COSTLY', cost=query_cost.cost, limit=COST['MAX_COST'],
+        )
+
+    rate = COST['THROTTLE_RATE']
+    if rate and request is not None:
+        key = throttle_key(request)
+        cache.add(key, 0, COST['THROTTLE_WINDOW'])
+        try:
+            spent = cache.incr(key, query_cost.cost)
+        except ValueError:
+            cache.set(key, query_cost.cost, COST['THROTTLE_WINDOW'])
+            spent = query_cost.cost
+        if spent > rate:
+            raise QueryCostError(
+                f'Query budget of {rate} per {COST["THROTTLE_WINDOW"]} seconds exceeded, try again later.',
+                'QUERY_THROTTLED', cost=query_cost.cost, limit=rate,
+            )
+    return query_cost
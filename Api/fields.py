@@ -0,0 +1,251 @@
+import json
+from base64 import b64decode, b64encode
+from functools import partial
+
+from django.db.models import F, Q
+from graphene.relay import PageInfo
+from graphene_django.filter import DjangoFilterConnectionField
+
+from Api.loaders import get_loaders
+from Api.optimizer import QueryOptimizer
+
+KEYSET_PREFIX = 'keyset:'
+
+
+class ConnectionField(DjangoFilterConnectionField):
+    """DjangoFilterConnectionField that optimizes its queryset for the
+    requested selection set and queues each returned page of nodes with
+    the request's batch loaders."""
+
+    @classmethod
+    def resolve_queryset(
+        cls, connection, iterable, info, args, filtering_args, filterset_class
+    ):
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return QueryOptimizer(info).optimize(queryset)
+
+    @classmethod
+    def queue_page(cls, connection, info, nodes):
+        '''Queue the page's keys, and the keys of the rows its foreign keys
+        point to, so loaders for either can batch over the whole page'''
+        if not nodes:
+            return
+        model = connection._meta.node._meta.model
+        loaders = get_loaders(info)
+        loaders.queue(model, [node.pk for node in nodes])
+        for field in model._meta.concrete_fields:
+            if field.many_to_one or field.one_to_one:
+                keys = [key for key in (getattr(node, field.attname) for node in nodes) if key is not None]
+                if keys:
+                    loaders.queue(field.related_model, keys)
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        result = super().connection_resolver(
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args,
+        )
+        edges = getattr(result, 'edges', None)
+        if edges:
+            cls.queue_page(connection, info, [edge.node for edge in edges])
+        return result
+
+
+def encode_keyset_cursor(values):
+    return b64encode((KEYSET_PREFIX + json.dumps(values)).encode('utf-8')).decode('ascii')
+
+
+def decode_keyset_cursor(cursor):
+    '''Return the list of key values in a keyset cursor, or None for any other cursor'''
+    try:
+        decoded = b64decode(cursor).decode('utf-8')
+    except Exception:
+        return None
+    if not decoded.startswith(KEYSET_PREFIX):
+        return None
+    try:
+        values = json.loads(decoded[len(KEYSET_PREFIX):])
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetConnectionField(ConnectionField):
+    """ConnectionField paginated by a keyset of ordering columns.
+
+    Cursors encode the values of `ordering` for the edge, and the next page
+    is read with a `WHERE (a, b) < (x, y)` style predicate instead of an
+    OFFSET, so every page costs the same however deep it is. `totalCount`
+    is only counted when selected. Requests that pass `offset`, `orderBy`
+    or an offset cursor fall back to the offset pagination.
+    """
+
+    def __init__(self, type_, *args, ordering=('-pk',), **kwargs):
+        self.ordering = ordering
+        super().__init__(type_, *args, **kwargs)
+
+    def get_keys(self):
+        keys = []
+        for lookup in self.ordering:
+            descending = lookup.startswith('-')
+            name = lookup.lstrip('-')
+            field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+            keys.append((field, descending))
+        return keys
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(
+            self.keyset_resolver,
+            self.get_keys(),
+            parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+            self.max_limit,
+            self.enforce_first_or_last,
+        )
+
+    @staticmethod
+    def order_by(keys, forward):
+        order = []
+        for field, descending in keys:
+            nulls = ({'nulls_last': True} if forward else {'nulls_first': True}) if field.null else {}
+            if descending == forward:
+                order.append(F(field.attname).desc(**nulls))
+            else:
+                order.append(F(field.attname).asc(**nulls))
+        return order
+
+    @staticmethod
+    def seek(keys, values, forward):
+        '''Predicate selecting the rows after (or before) `values` in key order.
+        Nulls sort last, matching `order_by`.'''
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(keys, values):
+            name = field.attname
+            if value is None:
+                step = Q(pk__in=[]) if forward else Q(**{f'{name}__isnull': False})
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                value = field.to_python(value)
+                step = Q(**{f'{name}__{"lt" if descending == forward else "gt"}': value})
+                if forward and field.null:
+                    step |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            condition |= equal & step
+            equal &= same
+        return condition
+
+    @staticmethod
+    def cursor_for(keys, node):
+        values = []
+        for field, descending in keys:
+            value = getattr(node, field.attname)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return encode_keyset_cursor(values)
+
+    @classmethod
+    def keyset_resolver(
+        cls,
+        keys,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        after, before = args.get('after'), args.get('before')
+        after_values = decode_keyset_cursor(after) if after else None
+        before_values = decode_keyset_cursor(before) if before else None
+        if (
+            args.get('offset') is not None
+            or args.get('order_by')
+            or (after and after_values is None)
+            or (before and before_values is None)
+        ):
+            return cls.connection_resolver(
+                resolver,
+                connection,
+                default_manager,
+                queryset_resolver,
+                max_limit,
+                enforce_first_or_last,
+                root,
+                info,
+                **args,
+            )
+
+        first, last = args.get('first'), args.get('last')
+        if enforce_first_or_last:
+            assert first or last, (
+                "You must provide a `first` or `last` value to properly paginate the `{}` connection."
+            ).format(info.field_name)
+        if max_limit:
+            for name, value in (('first', first), ('last', last)):
+                assert not value or value <= max_limit, (
+                    "Requesting {} records on the `{}` connection exceeds the `{}` limit of {} records."
+                ).format(value, info.field_name, name, max_limit)
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = queryset_resolver(connection, iterable, info, args)
+
+        forward = not (last and not first)
+        limit = (first if forward else last) or max_limit
+        page = queryset.order_by(*cls.order_by(keys, forward))
+        if after_values is not None:
+            page = page.filter(cls.seek(keys, after_values, True))
+        if before_values is not None:
+            page = page.filter(cls.seek(keys, before_values, False))
+        if limit is not None:
+            page = page[:limit + 1]
+        nodes = list(page)
+
+        has_more = limit is not None and len(nodes) > limit
+        nodes = nodes[:limit]
+        if not forward:
+            nodes.reverse()
+        elif last and len(nodes) > last:
+            nodes = nodes[-last:]
+            has_more = True
+
+        edges = [connection.Edge(node=node, cursor=cls.cursor_for(keys, node)) for node in nodes]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_more if not forward else after is not None,
+                has_next_page=has_more if forward else before is not None,
+            ),
+        )
+        result.iterable = queryset
+        result.length = None
+        cls.queue_page(connection, info, nodes)
+        return result
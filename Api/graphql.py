@@ -1,39 +1,147 @@
-from typing import Any, Dict
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isawaitable
+from typing import Any, Dict, List, Tuple
 from graphene_django.constants import MUTATION_ERRORS_FLAG
 from graphene_django.utils.utils import set_rollback
 from graphene_django.views import GraphQLView, HttpError
 from graphql import GraphQLError, GraphQLFormattedError
 
-from django.db import connection, transaction
-from django.http import HttpResponseNotAllowed
+from asgiref.sync import markcoroutinefunction
+from django.db import close_old_connections, connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils.decorators import classonlymethod, method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.http.response import HttpResponseBadRequest
 from graphql import (
+    ExecutionContext,
     ExecutionResult,
     OperationType,
     execute,
     get_operation_ast,
     parse,
+    specified_rules,
     validate_schema,
 )
 from graphql.error import GraphQLError
+from graphql.pyutils import Path, Undefined
 from graphql.validation import validate
 from graphene_django.constants import MUTATION_ERRORS_FLAG
 from graphene_django.utils.utils import set_rollback
 from graphene_django.settings import graphene_settings
+from django.conf import settings
+from Api import encoding, incremental, metrics, responsecache
+from Api.cost import QueryCostError, check_query_cost
+from Api.documents import CachedDocument, DocumentCache
+from Api.loaders import Loaders
+from Api.persisted import PersistedQueryError, resolve_persisted_query
+from Api.profiling import FieldProfiler, start_profile
 
 class RkFormattedError(GraphQLFormattedError):
     stack: Dict[str, Any]
 
 class GraphQl(GraphQLView):
     graphiql_template = 'graphql/view.html'
+    validation_rules = (*specified_rules, incremental.StreamOnListFieldRule)
+
+    # Shared by every request served by this process; views are
+    # instantiated per request so the cache has to live on the class.
+    document_cache = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 512))
+    _schema_validation_errors: Dict[int, List[GraphQLError]] = {}
+    _schema_validation_lock = threading.Lock()
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        # Documents already looked up for this request, by query text, so the
+        # steps that need one share a single document_cache lookup.
+        self.request_documents: Dict[str, CachedDocument] = {}
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except Exception:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+
+        query = resolve_persisted_query(query, extensions)
+        return query, variables, operation_name, id
+
+    def dispatch(self, request, *args, **kwargs):
+        with metrics.track_sql('api'):
+            response = super().dispatch(request, *args, **kwargs)
+        if getattr(request, "streamed_content", None) is not None:
+            response = StreamingHttpResponse(
+                request.streamed_content, status=response.status_code, content_type="application/json"
+            )
+        return responsecache.add_headers(request, response, getattr(request, "cached_response", None))
 
     def get_response(self, request, data, show_graphiql=False):
-        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        started = time.perf_counter()
+        try:
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+        except PersistedQueryError as e:
+            query, variables, operation_name = None, None, None
+            response = self.build_response(request, ExecutionResult(data=None, errors=[e]), data.get("id"), show_graphiql)
+        else:
+            plan = None if show_graphiql else self.lookup_response(request, query, variables, operation_name)
+            if plan is not None and plan.cached is not None:
+                request.cached_response = plan.cached
+                response = plan.cached.body, plan.cached.status
+            else:
+                execution_result = self.execute_graphql_request(
+                    request, data, query, variables, operation_name, show_graphiql
+                )
+                response = self.build_response(request, execution_result, id, show_graphiql, stream=plan is None)
+                self.store_response(request, plan, execution_result, response)
+                if isinstance(response[0], Iterator):
+                    request.streamed_content, response = response[0], ("", response[1])
+        self.observe_operation(query, operation_name, started, response[1])
+        return response
+
+    def lookup_response(self, request, query, variables, operation_name):
+        '''The responsecache.Plan for this request, or None when its response can not be cached'''
+        if self.batch or not query or not responsecache.RESPONSE_CACHE['ENABLED']:
+            return None
+        schema = self.schema.graphql_schema # type: ignore
+        try:
+            document, validation_errors = self.get_validated_document(schema, query)
+        except Exception:
+            return None
+        if validation_errors:
+            return None
+        return responsecache.lookup(request, schema, document, operation_name, variables)
 
-        execution_result = self.execute_graphql_request(
-            request, data, query, variables, operation_name, show_graphiql
+    def store_response(self, request, plan, execution_result, response):
+        if plan is not None and execution_result is not None and not execution_result.errors and response[1] == 200:
+            request.cached_response = responsecache.store(plan, *response)
+
+    def observe_operation(self, query, operation_name, started, status_code):
+        if not operation_name and query:
+            # Only read the document this request already looked up, so the
+            # document_cache counters are left alone.
+            entry = self.request_documents.get(query)
+            operation_ast = get_operation_ast(entry.document) if entry is not None else None
+            if operation_ast is not None and operation_ast.name is not None:
+                operation_name = operation_ast.name.value
+        metrics.api_requests.observe(
+            time.perf_counter() - started, operation=operation_name or "", status=status_code
         )
 
+    def json_encode(self, request, d, pretty=False):
+        pretty = self.pretty or pretty or bool(request.GET.get("pretty"))
+        return encoding.get_encoder().encode(d, pretty)
+
+    def build_response(self, request, execution_result, id, show_graphiql=False, stream=False):
+        '''The encoded response and its status code. With `stream`, large
+        responses are returned as an iterator of encoded chunks instead.'''
         if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
             set_rollback()
 
@@ -53,11 +161,22 @@ class GraphQl(GraphQLView):
             else:
                 response["data"] = execution_result.data
 
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
             if self.batch:
                 response["id"] = id
                 response["status"] = status_code
 
-            result = self.json_encode(request, response, pretty=show_graphiql)
+            if (
+                stream
+                and not self.batch
+                and not (self.pretty or show_graphiql or request.GET.get("pretty"))
+                and encoding.should_stream(response)
+            ):
+                result = encoding.chunked(encoding.get_encoder().iterencode(response))
+            else:
+                result = self.json_encode(request, response, pretty=show_graphiql)
         else:
             result = None
         return result, status_code
@@ -72,12 +191,12 @@ class GraphQl(GraphQLView):
 
         schema = self.schema.graphql_schema # type: ignore
 
-        schema_validation_errors = validate_schema(schema)
+        schema_validation_errors = self.get_schema_validation_errors(schema)
         if schema_validation_errors:
             return ExecutionResult(data=None, errors=schema_validation_errors)
 
         try:
-            document = parse(query)
+            document, validation_errors = self.get_validated_document(schema, query)
         except Exception as e:
             return ExecutionResult(errors=[e]) # type: ignore
 
@@ -100,23 +219,29 @@ class GraphQl(GraphQLView):
                 )
             )
 
-        validation_errors = validate(
-            schema,
-            document,
-            self.validation_rules,
-            graphene_settings.MAX_VALIDATION_ERRORS, # type: ignore
-        )
-
         if validation_errors:
             return ExecutionResult(data=None, errors=validation_errors)
 
+        query_cost = None
+        if operation_ast is not None:
+            try:
+                query_cost = check_query_cost(request, schema, document, operation_ast, variables)
+            except QueryCostError as e:
+                return ExecutionResult(data=None, errors=[e])
+
+        profile = start_profile(request)
+        middleware = self.get_middleware(request)
+        if profile is not None:
+            middleware = [*(middleware or ()), FieldProfiler(profile)]
+
+        execute_started = time.perf_counter()
         try:
             execute_options = {
                 "root_value": self.get_root_value(request),
                 "context_value": self.get_context(request),
                 "variable_values": variables,
                 "operation_name": operation_name,
-                "middleware": self.get_middleware(request),
+                "middleware": middleware,
             }
             if self.execution_context_class:
                 execute_options[
@@ -135,12 +260,68 @@ class GraphQl(GraphQLView):
                     result = execute(schema, document, **execute_options)
                     if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
                         transaction.set_rollback(True)
-                return result
-
-            return execute(schema, document, **execute_options)
+            else:
+                result = execute(schema, document, **execute_options)
         except Exception as e:
             return ExecutionResult(errors=[e]) # type: ignore
 
+        def get_extensions():
+            metrics.api_phases.observe(time.perf_counter() - execute_started, phase="execute")
+            extensions = {}
+            if query_cost is not None:
+                extensions["cost"] = query_cost.as_extension()
+            if profile is not None:
+                report = profile.finish()
+                if profile.report:
+                    extensions["profile"] = report
+            return extensions
+
+        return self.add_extensions(result, get_extensions)
+
+    @classmethod
+    def add_extensions(cls, result, get_extensions):
+        '''Merge get_extensions() into the extensions of `result` once it has been executed'''
+        if isawaitable(result):
+            async def await_result():
+                return cls.add_extensions(await result, get_extensions)
+            return await_result()
+        extensions = get_extensions()
+        if extensions:
+            result.extensions = {**(result.extensions or {}), **extensions}
+        return result
+
+
+    @classmethod
+    def get_schema_validation_errors(cls, schema) -> List[GraphQLError]:
+        errors = cls._schema_validation_errors.get(id(schema))
+        if errors is None:
+            with cls._schema_validation_lock:
+                errors = cls._schema_validation_errors.get(id(schema))
+                if errors is None:
+                    errors = validate_schema(schema)
+                    cls._schema_validation_errors[id(schema)] = errors
+        return errors
+
+    def get_validated_document(self, schema, query) -> Tuple[Any, List[GraphQLError]]:
+        entry = self.request_documents.get(query)
+        if entry is not None:
+            return entry.document, entry.errors
+        key = self.document_cache.key(query)
+        entry = self.document_cache.get(key)
+        if entry is None:
+            with metrics.api_phases.time(phase="parse"):
+                document = parse(query)
+            with metrics.api_phases.time(phase="validate"):
+                validation_errors = validate(
+                    schema,
+                    document,
+                    self.validation_rules,
+                    graphene_settings.MAX_VALIDATION_ERRORS, # type: ignore
+                )
+            entry = CachedDocument(document, validation_errors)
+            self.document_cache.set(key, entry)
+        self.request_documents[query] = entry
+        return entry.document, entry.errors
 
     @staticmethod
     def format_error(error):
@@ -161,6 +342,204 @@ class GraphQl(GraphQLView):
             return {"message": str(error), "stack": {"error": str(e)}}
 
 
+class ConcurrentRootExecutionContext(ExecutionContext):
+    """Resolves the root fields of a query concurrently in `executor`.
+
+    Everything below a root field is resolved in the thread the root field
+    runs in, so resolvers stay synchronous and keep using the ORM. The
+    connection a thread used is closed after each field, as it would be at
+    the end of a request.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=getattr(settings, 'GRAPHQL_ASYNC', {}).get('WORKERS', 8),
+        thread_name_prefix='graphql',
+    )
+
+    def execute_root_field(self, parent_type, source_value, field_nodes, path):
+        try:
+            return self.execute_field(parent_type, source_value, field_nodes, path)
+        finally:
+            close_old_connections()
+
+    def execute_fields(self, parent_type, source_value, path, fields):
+        if path is not None:
+            return super().execute_fields(parent_type, source_value, path, fields)
+
+        async def get_results():
+            loop = asyncio.get_running_loop()
+            names = list(fields)
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    self.executor, contextvars.copy_context().run, self.execute_root_field,
+                    parent_type, source_value, fields[name], Path(None, name, parent_type.name),
+                )
+                for name in names
+            ])
+            awaitable = [index for index, result in enumerate(results) if self.is_awaitable(result)]
+            for index, result in zip(awaitable, await asyncio.gather(*[results[index] for index in awaitable])):
+                results[index] = result
+            return {name: result for name, result in zip(names, results) if result is not Undefined}
+
+        return get_results()
+
+
+class IncrementalExecutionContext(incremental.IncrementalExecutionContext, ConcurrentRootExecutionContext):
+    """Executes the root fields of queries using @defer and @stream concurrently, as AsyncGraphQl does."""
+
+
+async def aiterate(chunks):
+    # Served as an async iterator, so the ASGI handler sends each chunk as
+    # it is encoded instead of collecting them all first.
+    for chunk in chunks:
+        yield chunk
+
+
+class AsyncGraphQl(GraphQl):
+    """GraphQl as an async view, for deployments served through asgi.py.
+
+    The request only holds a thread while its resolvers run: root fields of
+    queries are resolved concurrently in a thread pool of
+    GRAPHQL_ASYNC['WORKERS'] threads, and mutations run serially inside
+    their transaction in one thread of the same pool, as GraphQl runs them.
+    """
+    execution_context_class = ConcurrentRootExecutionContext
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        markcoroutinefunction(view)
+        return view
+
+    async def run_sync(self, function, *args):
+        def call():
+            try:
+                return function(*args)
+            finally:
+                close_old_connections()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(ConcurrentRootExecutionContext.executor, contextvars.copy_context().run, call)
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() == "get" and "text/html" in request.META.get("HTTP_ACCEPT", ""):
+            # GraphiQL, and raw responses to it, are served by GraphQl in a
+            # thread, which needs execute() to return the result itself.
+            self.execution_context_class = ExecutionContext
+            return await self.run_sync(super().dispatch, request, *args, **kwargs)
+        with metrics.track_sql('api'):
+            response = await self.dispatch_async(request)
+        return responsecache.add_headers(request, response, getattr(request, "cached_response", None))
+
+    async def dispatch_async(self, request):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            request.user = await request.auser()
+            data = self.parse_body(request)
+            if self.batch:
+                responses = await asyncio.gather(*[self.get_response_async(request, entry) for entry in data])
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = responses and max(responses, key=lambda response: response[1])[1] or 200
+            else:
+                result, status_code = await self.get_response_async(request, data)
+                if isinstance(result, AsyncIterator):
+                    return StreamingHttpResponse(result, status=status_code, content_type=incremental.CONTENT_TYPE)
+                if isinstance(result, Iterator):
+                    return StreamingHttpResponse(aiterate(result), status=status_code, content_type="application/json")
+
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_response_async(self, request, data):
+        started = time.perf_counter()
+        try:
+            query, variables, operation_name, id = await self.run_sync(self.get_graphql_params, request, data)
+        except PersistedQueryError as e:
+            query, variables, operation_name = None, None, None
+            response = self.build_response(request, ExecutionResult(data=None, errors=[e]), data.get("id"))
+        else:
+            plan = parts = None
+            is_query = self.is_query(query, operation_name)
+            if is_query and not self.batch and "multipart/mixed" in request.META.get("HTTP_ACCEPT", ""):
+                parts = self.execute_incremental(request, query, variables, operation_name)
+            if parts is None and is_query:
+                plan = await self.run_sync(self.lookup_response, request, query, variables, operation_name)
+            if parts is not None:
+                response = incremental.multipart(parts, self.encode_part), 200
+            elif plan is not None and plan.cached is not None:
+                request.cached_response = plan.cached
+                response = plan.cached.body, plan.cached.status
+            elif is_query:
+                context = self.get_context(request)
+                if getattr(context, 'loaders', None) is None:
+                    context.loaders = Loaders(context)
+                execution_result = self.execute_graphql_request(request, data, query, variables, operation_name)
+                if isawaitable(execution_result):
+                    execution_result = await execution_result
+                response = self.build_response(request, execution_result, id, stream=plan is None)
+                if plan is not None:
+                    await self.run_sync(self.store_response, request, plan, execution_result, response)
+            else:
+                execution_result = await self.run_sync(
+                    self.execute_graphql_request, request, data, query, variables, operation_name
+                )
+                response = self.build_response(request, execution_result, id)
+        self.observe_operation(query, operation_name, started, response[1])
+        return response
+
+    def execute_incremental(self, request, query, variables, operation_name):
+        '''The parts of the multipart response to a query using @defer or @stream, or None when it uses neither'''
+        schema = self.schema.graphql_schema # type: ignore
+        document, _ = self.get_validated_document(schema, query)
+        if not incremental.is_incremental(document, variables):
+            return None
+        operation_ast = get_operation_ast(document, operation_name)
+        try:
+            query_cost = check_query_cost(request, schema, document, operation_ast, variables)
+        except QueryCostError as e:
+            return incremental.payloads(ExecutionResult(data=None, errors=[e]), None, self.format_error)
+
+        context = self.get_context(request)
+        if getattr(context, 'loaders', None) is None:
+            context.loaders = Loaders(context)
+        context.incremental = incremental.Subsequent(self.run_sync)
+        result = execute(
+            schema,
+            document,
+            root_value=self.get_root_value(request),
+            context_value=context,
+            variable_values=variables,
+            operation_name=operation_name,
+            middleware=self.get_middleware(request),
+            execution_context_class=IncrementalExecutionContext,
+        )
+        result = self.add_extensions(result, lambda: {"cost": query_cost.as_extension()})
+        return incremental.payloads(result, context.incremental, self.format_error)
+
+    def encode_part(self, part):
+        return encoding.get_encoder().encode(part)
+
+    def is_query(self, query, operation_name) -> bool:
+        '''Whether `query` is a valid query operation, which is safe to execute from the event loop'''
+        if not query:
+            return False
+        try:
+            document, validation_errors = self.get_validated_document(self.schema.graphql_schema, query) # type: ignore
+        except Exception:
+            return False
+        operation_ast = get_operation_ast(document, operation_name)
+        return not validation_errors and operation_ast is not None and operation_ast.operation == OperationType.QUERY
+
+
 # class AuthGraphQLView(GraphQl):
 #     def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
 #         if not request.method.lower() == "get":
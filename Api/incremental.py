@@ -0,0 +1,431 @@
+'''@defer and @stream, delivered as multipart/mixed responses.
+
+graphql-core 3.2 executes neither directive, so AsyncGraphQl executes
+queries using them with an IncrementalExecutionContext. A fragment marked
+with @defer is left out of the object it selects from, then executed on
+that same object in a thread of its own once the object has been resolved.
+The items of a @stream list past initialCount are completed one at a time,
+as the list is iterated, and each is sent as soon as it is done. Every
+field is still resolved once, so the cost of the document is the cost of
+the whole response.
+
+Each deferred fragment and streamed item is sent once the part it was found
+in has been. Clients not accepting multipart/mixed, and every client of
+GraphQl, get the whole result at once, the directives being ignored.
+'''
+import asyncio
+import threading
+from copy import copy
+from inspect import isawaitable
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from graphql import (
+    BREAK,
+    DirectiveLocation,
+    DocumentNode,
+    ExecutionContext,
+    FieldNode,
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLDirective,
+    GraphQLError,
+    GraphQLInt,
+    GraphQLNonNull,
+    GraphQLString,
+    InlineFragmentNode,
+    OperationType,
+    SelectionSetNode,
+    ValidationRule,
+    Visitor,
+    get_nullable_type,
+    is_list_type,
+    located_error,
+    specified_directives,
+    visit,
+)
+from graphql.execution.collect_fields import does_fragment_condition_match, get_field_entry_key, should_include_node
+from graphql.execution.values import get_directive_values
+from graphql.pyutils import is_iterable
+
+BOUNDARY = 'graphql'
+CONTENT_TYPE = f'multipart/mixed; boundary="{BOUNDARY}"; deferSpec=20220824'
+
+# Part.parent of the parts sent after the initial result.
+INITIAL = -1
+
+DeferDirective = GraphQLDirective(
+    name='defer',
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+    },
+    description='Sends the fragment after the rest of the response, over multipart/mixed responses.',
+)
+
+StreamDirective = GraphQLDirective(
+    name='stream',
+    locations=[DirectiveLocation.FIELD],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+        'initialCount': GraphQLArgument(GraphQLNonNull(GraphQLInt), default_value=0),
+    },
+    description='Sends the items of a list past initialCount after the rest of the response, over multipart/mixed responses.',
+)
+
+directives = (*specified_directives, DeferDirective, StreamDirective)
+
+
+class StreamOnListFieldRule(ValidationRule):
+    """@stream may only be used on list fields."""
+
+    def enter_field(self, node, *args):
+        if any(directive.name.value == StreamDirective.name for directive in node.directives or ()):
+            field_type = self.context.get_type()
+            if field_type is not None and not is_list_type(get_nullable_type(field_type)):
+                self.report_error(GraphQLError(
+                    f"@stream can only be used on list fields, '{node.name.value}' is not one.", node,
+                ))
+
+
+def applied(node, directive: GraphQLDirective, variables) -> Optional[Dict[str, Any]]:
+    '''The arguments of `directive` on `node`, or None when it is absent or disabled with `if: false`'''
+    values = get_directive_values(directive, node, variables)
+    if values is None or not values['if']:
+        return None
+    return values
+
+
+class DirectiveFinder(Visitor):
+    """Finds whether a document applies @defer or @stream."""
+
+    def __init__(self, variables):
+        super().__init__()
+        self.variables = variables
+        self.found = False
+
+    def check(self, node, directive):
+        if applied(node, directive, self.variables) is None:
+            return None
+        self.found = True
+        return BREAK
+
+    def enter_field(self, node, *args):
+        return self.check(node, StreamDirective)
+
+    def enter_inline_fragment(self, node, *args):
+        return self.check(node, DeferDirective)
+
+    def enter_fragment_spread(self, node, *args):
+        return self.check(node, DeferDirective)
+
+
+def is_incremental(document: DocumentNode, variables) -> bool:
+    '''Whether `document` defers a fragment or streams a list'''
+    finder = DirectiveFinder(variables or {})
+    visit(document, finder)
+    return finder.found
+
+
+# (label, selection set) of the fragments deferred from a selection.
+Deferred = List[Tuple[Optional[str], SelectionSetNode]]
+
+
+def collect_deferring(context: ExecutionContext, runtime_type, selection_set, fields, deferred: Deferred, visited: Set[str]):
+    '''graphql-core's collect_fields_impl, adding the fragments marked with @defer to `deferred` instead of `fields`'''
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            if should_include_node(context.variable_values, selection):
+                fields.setdefault(get_field_entry_key(selection), []).append(selection)
+            continue
+        if isinstance(selection, InlineFragmentNode):
+            fragment = selection
+            if not should_include_node(context.variable_values, selection):
+                continue
+        else:
+            name = selection.name.value
+            if name in visited or not should_include_node(context.variable_values, selection):
+                continue
+            visited.add(name)
+            fragment = context.fragments.get(name)
+            if fragment is None:
+                continue
+        if not does_fragment_condition_match(context.schema, fragment, runtime_type):
+            continue
+        arguments = applied(selection, DeferDirective, context.variable_values)
+        if arguments is not None:
+            deferred.append((arguments.get('label'), fragment.selection_set))
+        else:
+            collect_deferring(context, runtime_type, fragment.selection_set, fields, deferred, visited)
+
+
+class Part:
+    '''A deferred fragment or streamed item, sent once the part `parent` has been'''
+    __slots__ = ('parent', 'entry')
+
+    def __init__(self, parent: int):
+        self.parent = parent
+        self.entry: Optional[Dict[str, Any]] = None
+
+
+class Subsequent:
+    """The parts of a response sent after its initial result.
+
+    Parts are added from the threads executing the response, and completed
+    by tasks of the event loop it was created in, which set `changed`.
+    `run_sync` runs a function in a thread and returns its result.
+    """
+
+    def __init__(self, run_sync: Callable[..., Awaitable[Any]]):
+        self.run_sync = run_sync
+        self.loop = asyncio.get_running_loop()
+        self.parts: List[Part] = []
+        self.changed = asyncio.Event()
+        self.closed = False
+        # Tasks started, or about to be, which may still add parts.
+        self.running = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    def add(self, parent: int) -> int:
+        with self._lock:
+            self.parts.append(Part(parent))
+            return len(self.parts) - 1
+
+    def start(self, function, *args) -> None:
+        '''Run the coroutine function(*args) as a task of the event loop, from any thread'''
+        with self._lock:
+            self.running += 1
+        self.loop.call_soon_threadsafe(self._start, function, args)
+
+    def _start(self, function, args) -> None:
+        if self.closed:
+            with self._lock:
+                self.running -= 1
+            return
+        task = self.loop.create_task(function(*args))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task) -> None:
+        self._tasks.discard(task)
+        with self._lock:
+            self.running -= 1
+        self.changed.set()
+
+    def finish(self, index: int, entry: Dict[str, Any], label, errors) -> None:
+        if label is not None:
+            entry['label'] = label
+        if errors:
+            entry['errors'] = errors
+        self.parts[index].entry = entry
+        self.changed.set()
+
+    def defer(self, context: 'IncrementalExecutionContext', runtime_type, source, path, selection_set, label) -> None:
+        '''Execute `selection_set` on `source`, the object at `path`, as a part of its own'''
+        child = context.child(self.add(context.part))
+
+        def execute():
+            fields = child.collect(runtime_type, (selection_set,), source, path)
+            return child.execute_fields(runtime_type, source, path, fields)
+
+        self.start(self.execute, child, execute, path.as_list() if path else [], label)
+
+    async def execute(self, child, execute, path, label) -> None:
+        try:
+            data = await self.run_sync(execute)
+            if isawaitable(data):
+                data = await data
+        except Exception as error:
+            child.errors.append(located_error(error, None, path))
+            data = None
+        self.finish(child.part, {'data': data, 'path': path}, label, child.errors)
+
+    def stream(self, context: 'IncrementalExecutionContext', item_type, field_nodes, info, path, items, index, label) -> None:
+        '''Complete the rest of `items`, starting at `index`, as a part each'''
+        self.start(self.complete_items, context, item_type, field_nodes, info, path, items, index, label)
+
+    async def complete_items(self, context, item_type, field_nodes, info, path, items, index, label) -> None:
+        end = object()
+
+        def complete_next(parent, index):
+            # The list may still be fetching its items as it is iterated.
+            item_path = path.add_key(index, None)
+            try:
+                item = next(items, end)
+            except Exception as error:
+                child = context.child(self.add(parent))
+                child.errors.append(located_error(error, field_nodes, path.as_list()))
+                return child, end
+            if item is end:
+                return None, end
+            child = context.child(self.add(parent))
+            try:
+                return child, child.complete_value(item_type, field_nodes, info, item_path, item)
+            except Exception as error:
+                # The item is null, even when its type is non-null: the
+                # list it belongs to has already been sent.
+                child.errors.append(located_error(error, field_nodes, item_path.as_list()))
+                return child, None
+
+        # Each item is sent after the one before it.
+        parent = context.part
+        while True:
+            child, item = await self.run_sync(complete_next, parent, index)
+            if child is None:
+                return
+            if item is end:
+                self.finish(child.part, {'items': None, 'path': [*path.as_list(), index]}, label, child.errors)
+                return
+            if isawaitable(item):
+                try:
+                    item = await item
+                except Exception as error:
+                    child.errors.append(located_error(error, field_nodes, path.add_key(index, None).as_list()))
+                    item = None
+            self.finish(child.part, {'items': [item], 'path': [*path.as_list(), index]}, label, child.errors)
+            parent, index = child.part, index + 1
+
+    def ready(self, sent: Set[int]) -> List[int]:
+        '''The completed parts not sent yet whose parent has been sent, or is about to be'''
+        ready: List[int] = []
+        for index, part in enumerate(self.parts):
+            if index not in sent and part.entry is not None and (part.parent in sent or part.parent in ready):
+                ready.append(index)
+        return ready
+
+    def has_next(self, sent: Set[int]) -> bool:
+        # `sent` holds INITIAL besides the parts.
+        return not self.closed and (self.running > 0 or len(sent) <= len(self.parts))
+
+    def close(self) -> None:
+        self.closed = True
+        for task in list(self._tasks):
+            task.cancel()
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    """Executes queries using @defer and @stream, leaving what they delay to a Subsequent.
+
+    The Subsequent is `context_value.incremental`; without one, the
+    directives are ignored. Each part is executed by a copy of the context,
+    collecting the errors of that part.
+    """
+    part = INITIAL
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._collected_cache: Dict[Tuple, Tuple[Dict[str, List[FieldNode]], Deferred]] = {}
+
+    @property
+    def subsequent(self) -> Optional[Subsequent]:
+        return getattr(self.context_value, 'incremental', None)
+
+    def child(self, part: int) -> 'IncrementalExecutionContext':
+        context = copy(self)
+        context.part = part
+        context.errors = []
+        return context
+
+    def split(self, runtime_type, selection_sets: Iterable[SelectionSetNode]) -> Tuple[Dict[str, List[FieldNode]], Deferred]:
+        '''The fields of `selection_sets` to execute now, and the fragments deferred from them'''
+        selection_sets = tuple(selection_sets)
+        key = (runtime_type, *map(id, selection_sets))
+        collected = self._collected_cache.get(key)
+        if collected is None:
+            fields: Dict[str, List[FieldNode]] = {}
+            deferred: Deferred = []
+            visited: Set[str] = set()
+            for selection_set in selection_sets:
+                collect_deferring(self, runtime_type, selection_set, fields, deferred, visited)
+            collected = self._collected_cache[key] = (fields, deferred)
+        return collected
+
+    def collect(self, runtime_type, selection_sets, source, path) -> Dict[str, List[FieldNode]]:
+        '''The fields of `selection_sets` to execute on `source` now, deferring the rest'''
+        fields, deferred = self.split(runtime_type, selection_sets)
+        for label, selection_set in deferred:
+            self.subsequent.defer(self, runtime_type, source, path, selection_set, label)
+        return fields
+
+    def execute_operation(self, operation, root_value):
+        if self.subsequent is None or operation.operation != OperationType.QUERY:
+            return super().execute_operation(operation, root_value)
+        root_type = self.schema.query_type
+        fields = self.collect(root_type, (operation.selection_set,), root_value, None)
+        return self.execute_fields(root_type, root_value, None, fields)
+
+    def collect_subfields(self, return_type, field_nodes):
+        if self.subsequent is None:
+            return super().collect_subfields(return_type, field_nodes)
+        return self.split(return_type, (node.selection_set for node in field_nodes if node.selection_set))[0]
+
+    def complete_object_value(self, return_type, field_nodes, info, path, result):
+        completed = super().complete_object_value(return_type, field_nodes, info, path, result)
+        if self.subsequent is not None:
+            selection_sets = (node.selection_set for node in field_nodes if node.selection_set)
+            for label, selection_set in self.split(return_type, selection_sets)[1]:
+                self.subsequent.defer(self, return_type, result, path, selection_set, label)
+        return completed
+
+    def complete_list_value(self, return_type, field_nodes, info, path, result):
+        arguments = applied(field_nodes[0], StreamDirective, self.variable_values)
+        if self.subsequent is None or arguments is None or not is_iterable(result):
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+        items = iter(result)
+        initial = [item for _, item in zip(range(arguments['initialCount']), items)]
+        completed = super().complete_list_value(return_type, field_nodes, info, path, initial)
+        self.subsequent.stream(
+            self, return_type.of_type, field_nodes, info, path, items, len(initial), arguments.get('label'),
+        )
+        return completed
+
+
+async def payloads(initial, subsequent: Optional[Subsequent], format_error: Callable):
+    '''The initial result, then the parts of `subsequent` in batches, as they complete'''
+    def errors(errors) -> Dict[str, Any]:
+        return {'errors': [format_error(error) for error in errors]} if errors else {}
+
+    sent = {INITIAL}
+    try:
+        result = await initial if isawaitable(initial) else initial
+        if result.data is None and subsequent is not None:
+            subsequent.close()
+        payload = {**errors(result.errors), 'data': result.data}
+        if result.extensions:
+            payload['extensions'] = result.extensions
+        has_next = subsequent is not None and subsequent.has_next(sent)
+        yield {**payload, 'hasNext': has_next}
+
+        while has_next:
+            subsequent.changed.clear()
+            ready = subsequent.ready(sent)
+            if not ready:
+                if not subsequent.has_next(sent):
+                    break
+                await subsequent.changed.wait()
+                continue
+            sent.update(ready)
+            entries = []
+            for index in ready:
+                entry = subsequent.parts[index].entry
+                entries.append({**entry, **errors(entry.get('errors'))})
+            has_next = subsequent.has_next(sent)
+            yield {'incremental': entries, 'hasNext': has_next}
+        if has_next:
+            yield {'hasNext': False}
+    finally:
+        if subsequent is not None:
+            subsequent.close()
+
+
+async def multipart(parts, encode: Callable[[Any], str]):
+    '''`parts` encoded as the body of a multipart/mixed response'''
+    async for part in parts:
+        body = encode(part)
+        yield (
+            f'\r\n--{BOUNDARY}\r\nContent-Type: application/json; charset=utf-8\r\n\r\n'.encode('utf-8')
+            + (body if isinstance(body, bytes) else body.encode('utf-8'))
+        )
+    yield f'\r\n--{BOUNDARY}--\r\n'.encode('utf-8')
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import random
+import string
+import uuid
+import weakref
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+from Api.broker import decode_message, encode_message, pack, read_frame, route_of
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerConnection:
+    """One TCP connection to the broker, owned by a single event loop.
+
+    Frames written within `batch_interval` of each other, or until
+    `batch_size` of them are queued, go out in one write; callers wait for
+    the batch they are in to be handed to the socket.
+    """
+
+    def __init__(self, layer: 'BrokerChannelLayer'):
+        self.layer = layer
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._buffer: List[bytes] = []
+        self._batch: Optional[asyncio.Future] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @property
+    def closed(self) -> bool:
+        return self.writer is None or self.writer.is_closing()
+
+    async def open(self, receive=False):
+        self.reader, self.writer = await asyncio.open_connection(self.layer.host, self.layer.port)
+        if receive:
+            frames = [pack({'op': 'hello', 'route': self.layer.route})]
+            frames += [
+                pack({'op': 'group_add', 'group': group, 'channel': channel})
+                for group, channels in self.layer.groups.items() for channel in channels
+            ]
+            self.writer.write(b''.join(frames))
+            self._reader_task = asyncio.ensure_future(self.read_loop())
+
+    async def read_loop(self):
+        try:
+            while True:
+                header, flags, body = await read_frame(self.reader)
+                if header['op'] == 'deliver':
+                    self.layer.deliver(header['channels'], decode_message(flags, body))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning('Lost the connection to the channel broker')
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+
+    async def write(self, frame: bytes):
+        self._buffer.append(frame)
+        self.layer.stats['frames'] += 1
+        self.layer.stats['bytes'] += len(frame)
+        batch = self._batch
+        if batch is None:
+            batch = self._batch = asyncio.get_running_loop().create_future()
+            asyncio.get_running_loop().call_later(self.layer.batch_interval, self._flush, batch)
+        if len(self._buffer) >= self.layer.batch_size:
+            self._flush(batch)
+        await batch
+        await self.writer.drain()
+
+    def _flush(self, batch):
+        if batch is not self._batch:
+            return
+        frames, self._buffer, self._batch = self._buffer, [], None
+        try:
+            self.writer.write(b''.join(frames))
+            self.layer.stats['batches'] += 1
+        except Exception as error:
+            batch.set_exception(error)
+        else:
+            batch.set_result(None)
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """Channel layer for several worker processes, routed through Api.broker.
+
+    Each process keeps its channels' queues in memory like the in-memory
+    layer. Sends and group sends go to the broker, which forwards them once
+    per worker process to be delivered locally. Frames are batched per
+    event loop and message bodies over `compress_threshold` bytes are
+    zlib compressed.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self,
+        host='127.0.0.1',
+        port=6390,
+        expiry=60,
+        capacity=100,
+        channel_capacity=None,
+        batch_interval=0.002,
+        batch_size=256,
+        compress_threshold=1024,
+        compress_level=1,
+        **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.host, self.port = host, port
+        self.batch_interval, self.batch_size = batch_interval, batch_size
+        self.compress_threshold, self.compress_level = compress_threshold, compress_level
+        self.route = uuid.uuid4().hex
+        self.groups: Dict[str, Set[str]] = defaultdict(set)
+        self.stats = defaultdict(int)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._connections = weakref.WeakKeyDictionary()
+        self._receiver: Optional[BrokerConnection] = None
+
+    async def connection(self, receive=False) -> BrokerConnection:
+        loop = asyncio.get_running_loop()
+        if receive:
+            if self._receiver is None or self._receiver.closed:
+                self._receiver = BrokerConnection(self)
+                await self._receiver.open(receive=True)
+            return self._receiver
+        connection = self._connections.get(loop)
+        if connection is None or connection.closed:
+            connection = BrokerConnection(self)
+            await connection.open()
+            self._connections[loop] = connection
+        return connection
+
+    def queue(self, channel) -> asyncio.Queue:
+        queue = self._queues.get(channel)
+        if queue is None:
+            queue = self._queues[channel] = asyncio.Queue(self.get_capacity(channel))
+        return queue
+
+    def deliver(self, channels, message):
+        for channel in channels:
+            try:
+                self.queue(channel).put_nowait(message)
+            except asyncio.QueueFull:
+                self.stats['dropped'] += 1
+
+    def encode(self, message):
+        flags, body = encode_message(message, self.compress_threshold, self.compress_level)
+        self.stats['message_bytes'] += len(body)
+        return flags, body
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        if route_of(channel) == self.route and '!' in channel:
+            queue = self.queue(channel)
+            if queue.full():
+                raise ChannelFull(channel)
+            queue.put_nowait(message)
+            return
+        flags, body = self.encode(message)
+        await (await self.connection()).write(pack({'op': 'send', 'channel': channel}, flags, body))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        await self.connection(receive=True)
+        queue = self.queue(channel)
+        try:
+            return await queue.get()
+        except asyncio.CancelledError:
+            # Consumers cancel their pending receive when they stop, which
+            # closes the channel; its queue is dropped with it.
+            if queue.empty() and self._queues.get(channel) is queue:
+                del self._queues[channel]
+            raise
+
+    async def new_channel(self, prefix='specific.'):
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        channel = f'{prefix}{self.route}!{suffix}'
+        self.queue(channel)
+        return channel
+
+    async def flush(self):
+        self._queues.clear()
+        self.groups.clear()
+
+    async def close(self):
+        if self._receiver is not None:
+            self._receiver.close()
+        for connection in list(self._connections.values()):
+            connection.close()
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.groups[group].add(channel)
+        await (await self.connection()).write(pack({'op': 'group_add', 'group': group, 'channel': channel}))
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.groups[group].discard(channel)
+        if not self.groups[group]:
+            del self.groups[group]
+        await (await self.connection()).write(pack({'op': 'group_discard', 'group': group, 'channel': channel}))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        flags, body = self.encode(message)
+        await (await self.connection()).write(pack({'op': 'group_send', 'group': group}, flags, body))
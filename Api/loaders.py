@@ -0,0 +1,79 @@
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List
+
+
+class Loaders:
+    """Request-scoped registry of batch loaders.
+
+    Connection fields queue the primary keys of every row on the page they
+    return, so that a loader asked for one of those rows can load the
+    whole page with a single query instead of one query per row.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self._loaders: Dict[type, "BatchLoader"] = {}
+        self._pages: Dict[Any, List[Hashable]] = defaultdict(list)
+
+    def queue(self, model, keys: Iterable[Hashable]) -> None:
+        self._pages[model._meta.label].extend(keys)
+
+    def queued(self, model) -> List[Hashable]:
+        return self._pages.get(model._meta.label, [])
+
+    def get(self, loader_class) -> "BatchLoader":
+        loader = self._loaders.get(loader_class)
+        if loader is None:
+            loader = self._loaders[loader_class] = loader_class(self)
+        return loader
+
+
+class BatchLoader:
+    """Loads a value per key for `model`, batching all queued keys.
+
+    Subclasses implement `batch_load(keys)` returning a mapping of key to
+    value; keys missing from the mapping resolve to `default`.
+    """
+    model = None
+    default: Any = None
+
+    def __init__(self, loaders: Loaders):
+        self.loaders = loaders
+        self.context = loaders.context
+        self._results: Dict[Hashable, Any] = {}
+
+    @property
+    def user(self):
+        return getattr(self.context, 'user', None)
+
+    def batch_load(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        raise NotImplementedError
+
+    def load(self, key: Hashable) -> Any:
+        if key not in self._results:
+            keys = [k for k in dict.fromkeys(self.loaders.queued(self.model)) if k not in self._results]
+            if key not in keys:
+                keys.append(key)
+            results = self.batch_load(keys)
+            for k in keys:
+                self._results[k] = results.get(k, self.default)
+        return self._results[key]
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        self._results[key] = value
+
+    def clear(self, key: Hashable) -> None:
+        self._results.pop(key, None)
+
+
+def get_loaders(info) -> Loaders:
+    context = info.context
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders(context)
+        setattr(context, 'loaders', loaders)
+    return loaders
+
+
+def get_loader(info, loader_class) -> BatchLoader:
+    return get_loaders(info).get(loader_class)
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+
+from Api.broadcast import batcher
+from Api.subscriptions import MySubscription
+
+SUBSCRIPTION = 'subscription { testSubscription { event } }'
+
+
+class Command(BaseCommand):
+    help = ('Compare broadcasting events one at a time with queueing them through Api.broadcast.batcher '
+            'from a worker thread, as requests do, counting the messages connected websocket clients receive.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--clients', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, help='GRAPHQL_BROADCAST_BATCH["batch_size"] by default.')
+        parser.add_argument('--idle', type=float, default=2, help='Seconds without a message after which '
+                            'a client is done receiving.')
+
+    async def connect(self, application):
+        communicator = WebsocketCommunicator(
+            application, '/api/', subprotocols=['graphql-ws'],
+            headers=[(b'host', b'localhost'), (b'origin', b'http://localhost')],
+        )
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise CommandError('The websocket connection was refused.')
+        await communicator.send_json_to({'type': 'connection_init', 'payload': {}})
+        while (await communicator.receive_json_from()).get('type') != 'connection_ack':
+            pass
+        await communicator.send_json_to({'id': '1', 'type': 'start', 'payload': {'query': SUBSCRIPTION}})
+        return communicator
+
+    async def receive(self, communicator, idle):
+        '''Messages received until none came for `idle` seconds, returns (messages, last_received_at)'''
+        messages, received = 0, time.perf_counter()
+        # receive_nothing() waits without cancelling the application on timeout.
+        while not await communicator.receive_nothing(timeout=idle):
+            message = await communicator.receive_json_from()
+            if message.get('type') == 'data':
+                messages, received = messages + 1, time.perf_counter()
+        return messages, received
+
+    async def measure(self, name, communicators, events, idle, send):
+        '''Run `send` and report how long it blocked and when every client had received its messages'''
+        listeners = [asyncio.ensure_future(self.receive(communicator, idle)) for communicator in communicators]
+        started = time.perf_counter()
+        await send()
+        blocked = time.perf_counter() - started
+        results = await asyncio.gather(*listeners)
+        received = sum(messages for messages, _ in results)
+        expected = events * len(communicators)
+        elapsed = max([blocked, *(last - started for messages, last in results if messages)])
+        self.stdout.write(f'{name:<24} caller blocked {blocked * 1000:8.1f}ms, '
+                          f'all received after {elapsed * 1000:8.1f}ms, '
+                          f'{received} of {expected} messages received ({received / (expected or 1):6.1%} delivered)')
+
+    async def run(self, events, clients, idle):
+        from techgyan_backend.asgi import application
+
+        communicators = await asyncio.gather(*[self.connect(application) for _ in range(clients)])
+        # Give the subscriptions time to join their groups.
+        await asyncio.sleep(1)
+
+        async def sequential():
+            for index in range(events):
+                await MySubscription.broadcast_async(group='my_subscription', payload={'value': index})
+
+        def enqueue():
+            for index in range(events):
+                MySubscription.enqueue('my_subscription', {'value': index})
+
+        async def batched():
+            await asyncio.to_thread(enqueue)
+
+        await self.measure('await broadcast_async()', communicators, events, idle, sequential)
+        stats = batcher.stats()
+        await self.measure(f'enqueue() ({batcher.batch_size})', communicators, events, idle, batched)
+        self.stdout.write(f'{batcher.stats()["sent"] - stats["sent"]} sent in '
+                          f'{batcher.stats()["batches"] - stats["batches"]} batches, '
+                          f'{batcher.stats()["dropped"] - stats["dropped"]} dropped')
+
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    def handle(self, *args, events, clients, batch_size, idle, **options):
+        if batch_size is not None:
+            batcher.batch_size = batch_size
+        asyncio.run(self.run(events, clients, idle))
@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Api.broker import Broker
+from Api.layers import BrokerChannelLayer
+
+
+def run_broker(host, port):
+    asyncio.run(Broker().serve(host, port))
+
+
+def run_worker(host, port, channels, messages, ready, results):
+    async def main():
+        layer = BrokerChannelLayer(host=host, port=port, capacity=messages)
+        names = [await layer.new_channel() for _ in range(channels)]
+        for name in names:
+            await layer.group_add('bench', name)
+        await layer.connection(receive=True)
+        ready.put(True)
+
+        async def consume(name):
+            latencies = []
+            for _ in range(messages):
+                message = await layer.receive(name)
+                latencies.append(time.time() - message['sent'])
+            return latencies
+
+        latencies = sum(await asyncio.gather(*[consume(name) for name in names]), [])
+        await layer.close()
+        results.put((latencies, layer.stats['dropped']))
+
+    asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = ('Run the channel broker with several worker processes subscribed to one group, '
+            'publish to the group and report the delivery latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--channels', type=int, default=250, help='Group members per worker.')
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--rate', type=int, default=1000, help='Group sends per second.')
+        parser.add_argument('--payload', type=int, default=2048, help='Approximate message size in bytes.')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6391)
+        parser.add_argument('--timeout', type=float, default=60)
+
+    async def publish(self, host, port, messages, rate, payload):
+        layer = BrokerChannelLayer(host=host, port=port)
+        text = ' '.join(f'word{index % 97}' for index in range(payload // 7))
+        started = time.perf_counter()
+        for index in range(messages):
+            await layer.group_send('bench', {'type': 'bench', 'index': index, 'text': text, 'sent': time.time()})
+            await asyncio.sleep(max(0.0, started + (index + 1) / rate - time.perf_counter()))
+        elapsed = time.perf_counter() - started
+        await layer.close()
+        return elapsed, layer.stats
+
+    def handle(self, *args, workers, channels, messages, rate, payload, host, port, timeout, **options):
+        context = multiprocessing.get_context('fork')
+        ready, results = context.Queue(), context.Queue()
+        broker = context.Process(target=run_broker, args=(host, port), daemon=True)
+        broker.start()
+        time.sleep(0.5)
+        processes = [
+            context.Process(target=run_worker, args=(host, port, channels, messages, ready, results), daemon=True)
+            for _ in range(workers)
+        ]
+        try:
+            for process in processes:
+                process.start()
+            for _ in processes:
+                ready.get(timeout=timeout)
+
+            elapsed, stats = asyncio.run(self.publish(host, port, messages, rate, payload))
+            latencies, dropped = [], 0
+            for _ in processes:
+                worker_latencies, worker_dropped = results.get(timeout=timeout)
+                latencies += worker_latencies
+                dropped += worker_dropped
+        except Exception as error:
+            raise CommandError(f'The benchmark did not finish: {error!r}')
+        finally:
+            for process in processes + [broker]:
+                process.terminate()
+
+        latencies.sort()
+        expected = workers * channels * messages
+        self.stdout.write(f'{messages} group sends to {workers * channels} channels on {workers} workers '
+                          f'in {elapsed:.2f}s, {len(latencies)}/{expected} delivered, {dropped} dropped')
+        self.stdout.write(f'{stats["frames"]} frames in {stats["batches"]} writes, '
+                          f'bodies {stats["message_bytes"]} bytes for {messages * payload} bytes of payload')
+        self.stdout.write(f'latency: p50 {statistics.median(latencies) * 1000:.1f}ms, '
+                          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms, '
+                          f'max {latencies[-1] * 1000:.1f}ms')
@@ -0,0 +1,105 @@
+import json
+import re
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.utils import timezone
+from graphene_django.fields import DjangoConnectionField
+from graphene_django.filter import DjangoFilterConnectionField
+
+from Api.fields import KeysetConnectionField
+from Api.schema import schema
+
+
+def full_scans(plan):
+    '''Tables read with a full table scan according to an EXPLAIN output'''
+    vendor = connection.vendor
+    if vendor == 'mysql':
+        return sorted(set(re.findall(r'"table_name":\s*"([^"]+)",\s*"access_type":\s*"ALL"', plan)))
+    if vendor == 'postgresql':
+        return sorted(set(re.findall(r'Seq Scan on (\w+)', plan)))
+    if vendor == 'sqlite':
+        return sorted(set(re.findall(r'SCAN (\w+)(?! USING)(?:\s|$)', plan)))
+    return []
+
+
+def sample(field):
+    '''A value of the right type for `field` to put in an EXPLAINed predicate'''
+    if field.choices:
+        return field.choices[0][0]
+    if isinstance(field, models.DateTimeField):
+        return timezone.now()
+    if isinstance(field, models.DateField):
+        return timezone.now().date()
+    if isinstance(field, (models.IntegerField, models.AutoField, models.FloatField, models.DecimalField)):
+        return 1
+    if isinstance(field, models.BooleanField):
+        return True
+    return 'x'
+
+
+def explain(queryset):
+    if connection.vendor == 'mysql':
+        return json.dumps(json.loads(queryset.explain(format='json')))
+    return queryset.explain()
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the SQL generated for every connection in the schema and report full table scans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when a full scan is found.')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan.')
+
+    def lookup_field(self, model, field_name):
+        field = model._meta.get_field(field_name.split('__')[0])
+        for part in field_name.split('__')[1:]:
+            field = field.related_model._meta.get_field(part)
+        return field
+
+    def querysets(self, field):
+        model = field.model
+        queryset = field.node_type.get_queryset(
+            model._default_manager.all(), SimpleNamespace(variable_values={}, context=None)
+        )
+        if isinstance(field, KeysetConnectionField):
+            keys = field.get_keys()
+            first_page = queryset.order_by(*field.order_by(keys, True))
+            yield 'first page', first_page[:20]
+            cursor = [sample(key) for key, _ in keys]
+            yield 'next page', first_page.filter(field.seek(keys, cursor, True))[:20]
+        else:
+            first_page = queryset
+            yield 'first page', first_page[:20]
+
+        if isinstance(field, DjangoFilterConnectionField):
+            for name, filter_ in field.filterset_class.base_filters.items():
+                if getattr(filter_, 'lookup_expr', None) != 'exact' or not filter_.field_name:
+                    continue
+                try:
+                    value = sample(self.lookup_field(model, filter_.field_name))
+                except FieldDoesNotExist:
+                    continue
+                yield f'{name}={value!r}', first_page.filter(**{filter_.field_name: value})[:20]
+
+    def handle(self, *args, fail, verbose_plans, **options):
+        found = []
+        for name, field in schema.query._meta.fields.items():
+            if not isinstance(field, DjangoConnectionField):
+                continue
+            for label, queryset in self.querysets(field):
+                plan = explain(queryset)
+                scans = full_scans(plan)
+                if verbose_plans:
+                    self.stdout.write(f'{name} [{label}]\n{plan}\n')
+                if scans:
+                    found.append((name, label, scans))
+                    self.stdout.write(self.style.WARNING(f'{name} [{label}]: full scan of {", ".join(scans)}'))
+                else:
+                    self.stdout.write(f'{name} [{label}]: ok')
+
+        self.stdout.write(f'{len(found)} full table scan(s) found.')
+        if found and fail:
+            raise CommandError('Full table scans found.')
@@ -0,0 +1,102 @@
+import asyncio
+import statistics
+import time
+
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+
+from Api import broadcast
+from Content.subscriptions import story_activity
+
+SUBSCRIPTION = '''
+subscription StoryActivity($storyKey: String!) {
+    storyActivity(storyKey: $storyKey) { clapsDelta clapsCount }
+}
+'''
+
+
+class Command(BaseCommand):
+    help = ('Connect simulated websocket clients to storyActivity through the ASGI application, '
+            'publish a burst of claps from a worker thread, as requests do, and measure the coalesced delivery.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--rate', type=int, default=2000, help='Published events per second.')
+        parser.add_argument('--window', type=float, help='Coalescing window in seconds, '
+                            'GRAPHQL_BROADCAST_WINDOW by default.')
+        parser.add_argument('--story-key', default='loadtest')
+        parser.add_argument('--timeout', type=float, default=60)
+
+    async def connect(self, application, story_key, timeout):
+        communicator = WebsocketCommunicator(
+            application, '/api/', subprotocols=['graphql-ws'],
+            headers=[(b'host', b'localhost'), (b'origin', b'http://localhost')],
+        )
+        connected, _ = await communicator.connect(timeout=timeout)
+        if not connected:
+            raise CommandError('The websocket connection was refused.')
+        await communicator.send_json_to({'type': 'connection_init', 'payload': {}})
+        while (await communicator.receive_json_from(timeout=timeout)).get('type') != 'connection_ack':
+            pass
+        await communicator.send_json_to({
+            'id': '1', 'type': 'start',
+            'payload': {'query': SUBSCRIPTION, 'variables': {'storyKey': story_key}},
+        })
+        return communicator
+
+    async def listen(self, communicator, events, timeout):
+        '''Receive until all `events` claps have been seen, returns (messages, finished_at)'''
+        claps = messages = 0
+        while claps < events:
+            message = await communicator.receive_json_from(timeout=timeout)
+            activity = ((message.get('payload') or {}).get('data') or {}).get('storyActivity')
+            if message.get('type') == 'data' and activity:
+                messages += 1
+                claps += activity['clapsDelta'] or 0
+        return messages, time.perf_counter()
+
+    def publish(self, events, rate, story_key):
+        '''Publish `events` claps at `rate` per second, returns when the last one was published'''
+        started = time.perf_counter()
+        for index in range(events):
+            story_activity(story_key, claps_delta=1, claps_count=index + 1)
+            if index % 100 == 99:
+                time.sleep(max(0.0, started + (index + 1) / rate - time.perf_counter()))
+        return time.perf_counter()
+
+    async def run(self, clients, events, rate, window, story_key, timeout):
+        from techgyan_backend.asgi import application
+
+        started = time.perf_counter()
+        communicators = []
+        for start in range(0, clients, 100):
+            communicators += await asyncio.gather(*[
+                self.connect(application, story_key, timeout) for _ in range(min(100, clients - start))
+            ])
+        self.stdout.write(f'{clients} clients connected in {time.perf_counter() - started:.2f}s')
+        # Give the subscriptions time to join their groups.
+        await asyncio.sleep(1)
+
+        listeners = [asyncio.ensure_future(self.listen(communicator, events, timeout)) for communicator in communicators]
+        if window is not None:
+            broadcast.coalescer.window = window
+        sent = broadcast.coalescer.stats()['sent']
+        started = time.perf_counter()
+        published = await asyncio.to_thread(self.publish, events, rate, story_key)
+
+        results = await asyncio.gather(*listeners)
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        messages = [count for count, _ in results]
+        lag = sorted(finished - published for _, finished in results)
+        sent = broadcast.coalescer.stats()['sent'] - sent
+        self.stdout.write(f'{events} events published in {published - started:.2f}s, '
+                          f'{sent} broadcasts ({events / max(sent, 1):.0f} events each)')
+        self.stdout.write(f'messages per client: mean {statistics.mean(messages):.1f}, max {max(messages)}')
+        self.stdout.write(f'delivery after the last event: p50 {lag[len(lag) // 2] * 1000:.0f}ms, '
+                          f'p99 {lag[int(len(lag) * 0.99)] * 1000:.0f}ms, max {lag[-1] * 1000:.0f}ms')
+
+    def handle(self, *args, clients, events, rate, window, story_key, timeout, **options):
+        asyncio.run(self.run(clients, events, rate, window, story_key, timeout))
@@ -0,0 +1,20 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from Api.broker import Broker
+
+
+class Command(BaseCommand):
+    help = 'Run the message broker used by Api.layers.BrokerChannelLayer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6390)
+
+    def handle(self, *args, host, port, **options):
+        self.stdout.write(f'Channel broker listening on {host}:{port}')
+        try:
+            asyncio.run(Broker().serve(host, port))
+        except KeyboardInterrupt:
+            pass
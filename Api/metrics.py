@@ -0,0 +1,298 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# Label values past this many distinct combinations per metric are
+# reported as `other`, so clients can not blow up the series count with
+# made up operation names.
+MAX_SERIES = 500
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Metric:
+    """A metric whose values are kept in one dict per thread.
+
+    Updates only touch the calling thread's dict, so they never wait on a
+    lock; the dicts are summed when the metric is rendered.
+    """
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple, object]] = []
+        self._series = set()
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _shard(self) -> Dict[Tuple, object]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _key(self, labels) -> Tuple:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        if key not in self._series:
+            with self._lock:
+                if len(self._series) >= MAX_SERIES:
+                    return tuple('other' for _ in self.labelnames)
+                self._series.add(key)
+        return key
+
+    def _labels(self, key, extra: str = '') -> str:
+        pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+        yield from self.samples()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def totals(self) -> Dict[Tuple, float]:
+        totals: Dict[Tuple, float] = {}
+        for shard in list(self._shards):
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def samples(self):
+        for key, value in sorted(self.totals().items()):
+            yield f'{self.name}{self._labels(key)} {value}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            # One count per bucket plus +Inf, then the sum.
+            counts = shard[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        totals: Dict[Tuple, List[float]] = {}
+        for shard in list(self._shards):
+            for key, counts in list(shard.items()):
+                total = totals.setdefault(key, [0] * len(counts))
+                for index, count in enumerate(counts):
+                    total[index] += count
+        for key, counts in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{self._labels(key, le)} {cumulative}'
+            yield f'{self.name}_sum{self._labels(key)} {counts[-1]}'
+            yield f'{self.name}_count{self._labels(key)} {cumulative}'
+
+
+class CallbackGauge(Metric):
+    """A gauge read from `callback` when rendered, which returns (labels, value) pairs."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), callback: Callable = None):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        for labels, value in self.callback():
+            key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+            yield f'{self.name}{self._labels(key)} {value}'
+
+
+class CallbackCounter(CallbackGauge):
+    kind = 'counter'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as error:
+                lines.append(f'# {metric.name} failed: {escape(str(error))}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+registry = Registry()
+
+
+# SQL statements are counted for every connection; a request that wants
+# its own count sets `_sql_counter` for the duration of the request.
+_sql_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar('sql_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _sql_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sql_duration.observe(time.perf_counter() - started, vendor=context['connection'].vendor)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # First in the list: connection.execute_wrapper() pops the last wrapper
+    # on exit, and the connection may be opened inside such a block.
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+connection_created.connect(install_query_counter)
+
+
+@contextmanager
+def track_sql(view: str):
+    '''Count the SQL statements run while the block executes, including by threads started with a copy of its context'''
+    counter = [0]
+    token = _sql_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _sql_counter.reset(token)
+        sql_per_request.observe(counter[0], view=view)
+
+
+def timed_view(histogram: Histogram, view: str):
+    '''Observe the duration of a view in `histogram`, labelled with the response status'''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(request, *args, **kwargs):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = function(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                histogram.observe(time.perf_counter() - started, view=view, method=request.method, status=status)
+        return wrapper
+    return decorator
+
+
+def channel_layer_groups():
+    # Groups are created per story and post, so only totals are exported.
+    from channels.layers import get_channel_layer
+    sizes = [len(members) for members in list(getattr(get_channel_layer(), 'groups', {}).values())]
+    yield {'kind': 'groups'}, len(sizes)
+    yield {'kind': 'memberships'}, sum(sizes)
+    yield {'kind': 'largest'}, max(sizes, default=0)
+
+
+def broadcast_stats():
+    from Api.broadcast import batcher, coalescer
+    yield {'queue': 'coalescer', 'kind': 'published'}, coalescer.published
+    yield {'queue': 'coalescer', 'kind': 'sent'}, coalescer.sent
+    for kind, value in batcher.stats().items():
+        if kind != 'pending':
+            yield {'queue': 'batcher', 'kind': kind}, value
+    from channels.layers import get_channel_layer
+    stats = getattr(get_channel_layer(), 'stats', None)
+    if stats is not None:
+        yield {'queue': 'channel_layer', 'kind': 'dropped'}, stats.get('dropped', 0)
+
+
+def field_stats():
+    from Api.profiling import histograms
+    for field, stats in histograms.snapshot().items():
+        yield {'field': field, 'kind': 'calls'}, stats['count']
+        yield {'field': field, 'kind': 'ms'}, round(stats['sum_ms'], 3)
+        yield {'field': field, 'kind': 'sql'}, stats['sql_count']
+
+
+api_requests = Histogram(
+    'graphql_request_duration_seconds', 'GraphQL operations served over HTTP, by operation name.',
+    ('operation', 'status'),
+)
+api_phases = Histogram(
+    'graphql_phase_duration_seconds', 'Time spent parsing, validating and executing GraphQL operations.',
+    ('phase',),
+)
+sql_per_request = Histogram(
+    'sql_queries_per_request', 'SQL statements run per request.', ('view',), buckets=COUNT_BUCKETS,
+)
+sql_duration = Histogram('sql_query_duration_seconds', 'SQL statement durations.', ('vendor',))
+view_requests = Histogram(
+    'view_request_duration_seconds', 'Durations of plain Django views.', ('view', 'method', 'status'),
+)
+websocket_connections = Counter(
+    'websocket_connections_total', 'Websocket connections opened and closed.', ('event',),
+)
+subscription_groups = CallbackGauge(
+    'subscription_groups', 'Channel layer groups in this process, their memberships and the size of the largest.',
+    ('kind',), callback=channel_layer_groups,
+)
+broadcasts = CallbackCounter(
+    'subscription_broadcasts_total', 'Subscription broadcasts published, sent and dropped.',
+    ('queue', 'kind'), callback=broadcast_stats,
+)
+sampled_fields = CallbackCounter(
+    'graphql_sampled_field_total', 'Calls, milliseconds and SQL statements of resolvers in sampled requests.',
+    ('field', 'kind'), callback=field_stats,
+)
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,3 +1,16 @@
 from django.db import models
 
 # Create your models here.
+
+class PersistedQuery(models.Model):
+    hash = models.CharField(max_length=64, primary_key=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'persisted_queries'
+        verbose_name = 'persisted query'
+        verbose_name_plural = 'persisted queries'
+
+    def __str__(self):
+        return self.hash
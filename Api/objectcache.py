@@ -0,0 +1,233 @@
+'''Read-through cache of single model instances looked up by a unique field.
+
+Instances are stored once under their primary key; lookups by other unique
+fields (a Creator's handle, a User's username) store the primary key only
+and are checked against the instance they lead to, so a renamed object is
+never served under its old name.
+
+Keys carry two versions: CACHE_VERSION, bumped by hand when what is cached
+changes shape, and a per-model version that is bumped to drop every cached
+instance of a model at once. Saving or deleting an instance drops its own
+entry; saving or deleting a model it embeds through select_related or
+prefetch_related (an Image, Tag or Category) bumps the version of the
+models embedding it.
+
+When an entry is missing, only one process loads it from the database
+while others wait for it to appear, for up to WAIT seconds.
+
+Invalidation and that lock only reach the processes sharing the cache, so
+the cache is off unless ENABLED, which needs a cache backend shared by
+every worker (Redis, Memcached), not the per-process LocMemCache.
+'''
+import hashlib
+import time
+from typing import Dict, NamedTuple, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from Api import metrics
+
+CACHE_VERSION = 3
+
+OBJECT_CACHE = {
+    'ENABLED': False,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+    'WAIT': 0.5,
+    **getattr(settings, 'OBJECT_CACHE', {}),
+}
+
+
+class CachedModel(NamedTuple):
+    label: str
+    lookups: Tuple[str, ...]
+    select_related: Tuple[str, ...] = ()
+    prefetch_related: Tuple[str, ...] = ()
+    depends_on: Tuple[str, ...] = ()
+    # Fields left out of the cached instance, loaded on access.
+    defer: Tuple[str, ...] = ()
+
+
+MODELS: Dict[str, CachedModel] = {
+    cached.label: cached for cached in (
+        CachedModel(
+            'Content.Story', ('pk', 'slug'),
+            select_related=('author', 'image', 'category'), prefetch_related=('tags',),
+            depends_on=('Creator.Creator', 'Common.Image', 'Common.Category', 'Common.Tag'),
+        ),
+        CachedModel(
+            'Content.Post', ('pk',),
+            select_related=('author',), prefetch_related=('tags',),
+            depends_on=('Creator.Creator', 'Common.Tag'),
+        ),
+        CachedModel(
+            'Creator.Creator', ('pk', 'key', 'handle'),
+            select_related=('image', 'banner'), depends_on=('Common.Image',),
+        ),
+        CachedModel(
+            'User.User', ('pk', 'key', 'username'),
+            select_related=('image',), depends_on=('Common.Image',),
+            defer=('password', 'last_login', 'is_superuser', 'is_staff'),
+        ),
+    )
+}
+
+requests = metrics.Counter('object_cache_requests_total', 'Object cache lookups.', ('model', 'result'))
+
+
+def hit_ratios():
+    totals = requests.totals()
+    for label in MODELS:
+        hits, misses = totals.get((label, 'hit'), 0), totals.get((label, 'miss'), 0)
+        if hits or misses:
+            yield {'model': label}, round(hits / (hits + misses), 4)
+
+
+metrics.CallbackGauge('object_cache_hit_ratio', 'Object cache hits over lookups.', ('model',), callback=hit_ratios)
+
+
+def cache():
+    return caches[OBJECT_CACHE['ALIAS']]
+
+
+def version_key(label: str) -> str:
+    return f'objcache:{CACHE_VERSION}:{label}:version'
+
+
+def model_version(label: str) -> int:
+    version = cache().get(version_key(label))
+    if version is None:
+        cache().add(version_key(label), 1, None)
+        version = 1
+    return version
+
+
+def object_key(label: str, version: int, pk) -> str:
+    return f'objcache:{CACHE_VERSION}:{label}:{version}:{pk}'
+
+
+def index_key(label: str, field: str, value) -> str:
+    digest = hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+    return f'objcache:{CACHE_VERSION}:{label}:{field}:{digest}'
+
+
+def is_cached(model) -> bool:
+    return OBJECT_CACHE['ENABLED'] and model._meta.label in MODELS
+
+
+def _lookup(cached: CachedModel, version: int, field: str, value):
+    '''The cached instance for `field=value`, or None'''
+    pk = value if field == 'pk' else cache().get(index_key(cached.label, field, value))
+    if pk is None:
+        return None
+    instance = cache().get(object_key(cached.label, version, pk))
+    if instance is None or (field != 'pk' and getattr(instance, field) != value):
+        return None
+    return instance
+
+
+def _store(cached: CachedModel, version: int, instance) -> None:
+    entries = {object_key(cached.label, version, instance.pk): instance}
+    for field in cached.lookups:
+        if field != 'pk':
+            entries[index_key(cached.label, field, getattr(instance, field))] = instance.pk
+    cache().set_many(entries, OBJECT_CACHE['TIMEOUT'])
+
+
+def _load(model, cached: CachedModel, field: str, value):
+    queryset = model._default_manager.all()
+    if cached.select_related:
+        queryset = queryset.select_related(*cached.select_related)
+    if cached.prefetch_related:
+        queryset = queryset.prefetch_related(*cached.prefetch_related)
+    if cached.defer:
+        queryset = queryset.defer(*cached.defer)
+    return queryset.get(**{field: value})
+
+
+def get(model, **lookup):
+    '''The instance of `model` matching a single unique `lookup`, raising model.DoesNotExist like Manager.get'''
+    cached = MODELS.get(model._meta.label) if OBJECT_CACHE['ENABLED'] else None
+    (field, value), = lookup.items()
+    if cached is None or field not in cached.lookups:
+        return model._default_manager.get(**lookup)
+
+    version = model_version(cached.label)
+    instance = _lookup(cached, version, field, value)
+    if instance is not None:
+        requests.inc(model=cached.label, result='hit')
+        return instance
+    requests.inc(model=cached.label, result='miss')
+
+    lock = index_key(cached.label, f'{field}:lock', value)
+    if not cache().add(lock, 1, OBJECT_CACHE['LOCK_TIMEOUT']):
+        deadline = time.monotonic() + OBJECT_CACHE['WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            instance = _lookup(cached, version, field, value)
+            if instance is not None:
+                return instance
+        return _load(model, cached, field, value)
+    try:
+        instance = _load(model, cached, field, value)
+        _store(cached, version, instance)
+        return instance
+    finally:
+        cache().delete(lock)
+
+
+def invalidate(model, pk) -> None:
+    '''Drop the cached instance of `model` with `pk` once the current transaction commits'''
+    label = model._meta.label
+    if is_cached(model):
+        transaction.on_commit(lambda: cache().delete(object_key(label, model_version(label), pk)))
+
+
+def invalidate_model(label: str) -> None:
+    '''Drop every cached instance of the model `label` once the current transaction commits'''
+    if not OBJECT_CACHE['ENABLED']:
+        return
+
+    def bump():
+        try:
+            cache().incr(version_key(label))
+        except ValueError:
+            cache().set(version_key(label), 2, None)
+    transaction.on_commit(bump)
+
+
+def instance_changed(sender, instance, **kwargs):
+    label = sender._meta.label
+    invalidate(sender, instance.pk)
+    for cached in MODELS.values():
+        if label in cached.depends_on:
+            invalidate_model(cached.label)
+
+
+def relation_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    invalidate(type(instance), instance.pk)
+    if is_cached(model):
+        if pk_set is None:
+            invalidate_model(model._meta.label)
+        for pk in pk_set or ():
+            invalidate(model, pk)
+
+
+def connect_signals():
+    if not OBJECT_CACHE['ENABLED']:
+        return
+    senders = set(MODELS)
+    for cached in MODELS.values():
+        senders.update(cached.depends_on)
+    for label in senders:
+        model = apps.get_model(label)
+        post_save.connect(instance_changed, sender=model, dispatch_uid=f'objectcache:save:{label}')
+        post_delete.connect(instance_changed, sender=model, dispatch_uid=f'objectcache:delete:{label}')
+    m2m_changed.connect(relation_changed, dispatch_uid='objectcache:m2m')
@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional
+
+from django.db.models import BinaryField, JSONField, Prefetch, TextField
+from django.core.exceptions import FieldDoesNotExist
+from graphene.utils.str_converters import to_camel_case
+from graphql import GraphQLObjectType, get_named_type
+from graphql.execution.collect_fields import collect_sub_fields
+
+# Columns that are expensive to transfer and are deferred unless selected.
+HEAVY_FIELDS = (TextField, JSONField, BinaryField)
+
+
+class QueryPlan:
+    """select_related / prefetch_related / defer lookups for one queryset."""
+
+    def __init__(self):
+        self.select_related: List[str] = []
+        self.prefetch_related: List = []
+        self.deferred: List[str] = []
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.deferred:
+            queryset = queryset.defer(*self.deferred)
+        return queryset
+
+
+def get_field_names(graphene_type) -> Dict[str, str]:
+    '''Map schema field names of a graphene type to its python attribute names'''
+    names = {}
+    for name, field in graphene_type._meta.fields.items():
+        names[getattr(field, 'name', None) or to_camel_case(name)] = name
+        names.setdefault(name, name)
+    return names
+
+
+def get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def is_connection(object_type) -> bool:
+    return isinstance(object_type, GraphQLObjectType) and 'edges' in object_type.fields and 'pageInfo' in object_type.fields
+
+
+class QueryOptimizer:
+    """Reads the selection set of the field being resolved and derives the
+    joins, prefetches and deferred columns needed to resolve it.
+    """
+
+    def __init__(self, info):
+        self.info = info
+
+    def sub_fields(self, object_type, field_nodes):
+        return collect_sub_fields(
+            self.info.schema, self.info.fragments, self.info.variable_values, object_type, field_nodes
+        )
+
+    def unwrap_connection(self, object_type, field_nodes):
+        for name in ('edges', 'node'):
+            nodes = [node for nodes in self.sub_fields(object_type, field_nodes).values()
+                     for node in nodes if node.name.value == name]
+            if not nodes:
+                return None, []
+            object_type = get_named_type(object_type.fields[name].type)
+            field_nodes = nodes
+        return object_type, field_nodes
+
+    def plan(self, object_type, field_nodes, plan: Optional[QueryPlan] = None, prefix='') -> QueryPlan:
+        plan = plan or QueryPlan()
+        graphene_type = getattr(object_type, 'graphene_type', None)
+        model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+        if model is None:
+            return plan
+
+        names = get_field_names(graphene_type)
+        selected = set()
+
+        for nodes in self.sub_fields(object_type, field_nodes).values():
+            schema_name = nodes[0].name.value
+            if schema_name.startswith('__'):
+                continue
+            name = names.get(schema_name, schema_name)
+            selected.add(name)
+
+            model_field = get_model_field(model, name)
+            if model_field is None or not model_field.is_relation:
+                continue
+
+            related_type = get_named_type(object_type.fields[schema_name].type)
+            if is_connection(related_type):
+                # Connections filter and paginate their own querysets, so
+                # anything prefetched here would be thrown away.
+                continue
+
+            if model_field.many_to_one or (model_field.one_to_one and model_field.concrete):
+                plan.select_related.append(prefix + name)
+                if isinstance(related_type, GraphQLObjectType):
+                    self.plan(related_type, nodes, plan, prefix=f'{prefix}{name}__')
+            else:
+                related_plan = QueryPlan()
+                if isinstance(related_type, GraphQLObjectType):
+                    self.plan(related_type, nodes, related_plan)
+                related_queryset = related_plan.apply(model_field.related_model._default_manager.all())
+                plan.prefetch_related.append(Prefetch(prefix + name, queryset=related_queryset))
+
+        for field in model._meta.concrete_fields:
+            if isinstance(field, HEAVY_FIELDS) and field.name not in selected:
+                plan.deferred.append(prefix + field.name)
+        return plan
+
+    def optimize(self, queryset, object_type=None, field_nodes=None):
+        object_type = object_type or get_named_type(self.info.return_type)
+        field_nodes = field_nodes or self.info.field_nodes
+        if is_connection(object_type):
+            object_type, field_nodes = self.unwrap_connection(object_type, field_nodes)
+            if object_type is None:
+                return queryset
+        return self.plan(object_type, field_nodes).apply(queryset)
+
+
+def optimize(queryset, info):
+    '''Optimize `queryset` for the selection set of the field being resolved'''
+    return QueryOptimizer(info).optimize(queryset)
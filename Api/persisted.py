@@ -0,0 +1,139 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from graphql import GraphQLError
+
+SHA256_HASH = re.compile(r'[0-9a-f]{64}')
+
+
+class PersistedQueryError(GraphQLError):
+    """Raised when a persisted query can not be resolved or registered."""
+
+
+class PersistedQueryNotFound(PersistedQueryError):
+    def __init__(self):
+        super().__init__(
+            'PersistedQueryNotFound',
+            extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+        )
+
+
+class PersistedQueryStore:
+    """Maps sha256 hashes of query text to the query text itself."""
+
+    def get(self, sha256_hash: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, sha256_hash: str, query: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryQueryStore(PersistedQueryStore):
+    """Bounded in-process store, lost on restart and not shared by workers."""
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._queries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sha256_hash):
+        with self._lock:
+            query = self._queries.get(sha256_hash)
+            if query is not None:
+                self._queries.move_to_end(sha256_hash)
+            return query
+
+    def set(self, sha256_hash, query):
+        with self._lock:
+            self._queries[sha256_hash] = query
+            self._queries.move_to_end(sha256_hash)
+            while len(self._queries) > self.maxsize:
+                self._queries.popitem(last=False)
+
+
+class CacheQueryStore(PersistedQueryStore):
+    """Store backed by one of the configured Django caches."""
+
+    def __init__(self, alias: str = 'default', timeout: Optional[int] = None, prefix: str = 'apq'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+
+    def key(self, sha256_hash):
+        return f'{self.prefix}:{sha256_hash}'
+
+    def get(self, sha256_hash):
+        return caches[self.alias].get(self.key(sha256_hash))
+
+    def set(self, sha256_hash, query):
+        caches[self.alias].set(self.key(sha256_hash), query, self.timeout)
+
+
+class DatabaseQueryStore(PersistedQueryStore):
+    """Durable store backed by the `persisted_queries` table."""
+
+    def get(self, sha256_hash):
+        from Api.models import PersistedQuery
+        return PersistedQuery.objects.filter(hash=sha256_hash).values_list('query', flat=True).first()
+
+    def set(self, sha256_hash, query):
+        from Api.models import PersistedQuery
+        PersistedQuery.objects.get_or_create(hash=sha256_hash, defaults={'query': query})
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_persisted_query_store() -> PersistedQueryStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {})
+                store_class = import_string(config.get('STORE', 'Api.persisted.MemoryQueryStore'))
+                _store = store_class(**config.get('OPTIONS', {}))
+    return _store
+
+
+def resolve_persisted_query(query: Optional[str], extensions: Any) -> Optional[str]:
+    """Apply the automatic persisted query protocol to a request.
+
+    A request carrying only `extensions.persistedQuery.sha256Hash` is
+    answered from the store; a request carrying both the hash and the
+    query text registers the query for later hashed requests.
+    """
+    if not extensions:
+        return query
+    if not isinstance(extensions, dict):
+        raise PersistedQueryError('Extensions must be an object.')
+    persisted = extensions.get('persistedQuery')
+    if not persisted:
+        return query
+    if not isinstance(persisted, dict):
+        raise PersistedQueryError('persistedQuery must be an object.')
+    if persisted.get('version', 1) != 1:
+        raise PersistedQueryError('Unsupported persisted query version.')
+    sha256_hash = persisted.get('sha256Hash')
+    if not sha256_hash:
+        raise PersistedQueryError('Persisted query is missing sha256Hash.')
+    if not isinstance(sha256_hash, str) or not SHA256_HASH.fullmatch(sha256_hash):
+        raise PersistedQueryError('sha256Hash must be a hex encoded sha256 digest.')
+
+    store = get_persisted_query_store()
+    if not query:
+        query = store.get(sha256_hash)
+        if query is None:
+            raise PersistedQueryNotFound()
+        return query
+
+    if hashlib.sha256(query.encode('utf-8')).hexdigest() != sha256_hash:
+        raise PersistedQueryError('Provided sha256Hash does not match query.')
+    store.set(sha256_hash, query)
+    return query
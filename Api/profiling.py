@@ -0,0 +1,174 @@
+import bisect
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from inspect import isawaitable
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import QuerySet
+
+logger = logging.getLogger(__name__)
+
+PROFILING = {
+    'HEADER': 'X-GraphQL-Profile',
+    'SAMPLE_RATE': 0.01,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    **getattr(settings, 'GRAPHQL_PROFILING', {}),
+}
+
+# Upper bounds of the resolver duration buckets, in milliseconds.
+BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_in_list = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def sql_shape(sql: str) -> str:
+    '''`sql` with the placeholders of IN lists collapsed, so pages of different sizes compare equal'''
+    return _in_list.sub('IN (...)', sql)
+
+
+def field_key(path: List[Any]) -> str:
+    return '.'.join(str(key) for key in path if not isinstance(key, int))
+
+
+class FieldHistograms:
+    """Resolver durations and SQL counts aggregated per `Type.field`, for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fields: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, field: str, duration: float, queries: int, sql_duration: float) -> None:
+        milliseconds = duration * 1000
+        with self._lock:
+            stats = self._fields.get(field)
+            if stats is None:
+                stats = self._fields[field] = {
+                    'count': 0, 'sum_ms': 0.0, 'sql_count': 0, 'sql_ms': 0.0,
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                }
+            stats['count'] += 1
+            stats['sum_ms'] += milliseconds
+            stats['sql_count'] += queries
+            stats['sql_ms'] += sql_duration * 1000
+            stats['buckets'][bisect.bisect_left(BUCKETS, milliseconds)] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {field: {**stats, 'buckets': list(stats['buckets'])} for field, stats in self._fields.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._fields.clear()
+
+
+histograms = FieldHistograms()
+
+
+class Profile:
+    """Resolver timings and the SQL each resolver ran, for one operation."""
+
+    def __init__(self, report: bool):
+        self.report = report
+        self.started = time.perf_counter()
+        self.fields: Dict[str, Dict[str, Any]] = {}
+        # (field key, sql shape) -> paths of the parents that ran it
+        self.statements: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, info, duration: float, queries: List[Tuple[str, float]]) -> None:
+        path = info.path.as_list()
+        key = field_key(path)
+        parent = '.'.join(str(item) for item in path[:-1])
+        sql_duration = sum(elapsed for _, elapsed in queries)
+        with self._lock:
+            stats = self.fields.get(key)
+            if stats is None:
+                stats = self.fields[key] = {'path': key, 'calls': 0, 'ms': 0.0, 'max_ms': 0.0, 'sql_count': 0, 'sql_ms': 0.0}
+            stats['calls'] += 1
+            stats['ms'] += duration * 1000
+            stats['max_ms'] = max(stats['max_ms'], duration * 1000)
+            stats['sql_count'] += len(queries)
+            stats['sql_ms'] += sql_duration * 1000
+            for sql, _ in queries:
+                self.statements[(key, sql_shape(sql))].append(parent)
+        if not self.report:
+            histograms.observe(f'{info.parent_type.name}.{info.field_name}', duration, len(queries), sql_duration)
+
+    def n_plus_one(self) -> List[Dict[str, Any]]:
+        '''Resolvers that ran the same statement once for each of many parents'''
+        threshold = PROFILING['N_PLUS_ONE_THRESHOLD']
+        flagged = []
+        for (key, sql), parents in self.statements.items():
+            if len(parents) >= threshold and len(set(parents)) >= threshold:
+                flagged.append({'path': key, 'count': len(parents), 'sql': sql})
+        return sorted(flagged, key=lambda item: -item['count'])
+
+    def finish(self) -> Dict[str, Any]:
+        flagged = self.n_plus_one()
+        for item in flagged:
+            logger.warning('N+1 queries in %s: %d times %s', item['path'], item['count'], item['sql'])
+        fields = sorted(self.fields.values(), key=lambda stats: -stats['ms'])
+        for stats in fields:
+            stats['ms'] = round(stats['ms'], 3)
+            stats['max_ms'] = round(stats['max_ms'], 3)
+            stats['sql_ms'] = round(stats['sql_ms'], 3)
+        return {
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'sql_count': sum(stats['sql_count'] for stats in fields),
+            'fields': fields,
+            'n_plus_one': flagged,
+        }
+
+
+class FieldProfiler:
+    """Graphene middleware timing every resolver and the SQL it runs.
+
+    Querysets returned by a resolver are evaluated inside it, so their
+    query is counted against the field that built them.
+    """
+
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def resolve(self, next, root, info, **args):
+        queries: List[Tuple[str, float]] = []
+
+        def record_sql(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((sql, time.perf_counter() - started))
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(record_sql):
+            result = next(root, info, **args)
+            if isinstance(result, QuerySet):
+                result._fetch_all()
+        if isawaitable(result):
+            return self.resolve_async(result, info, started, queries)
+        self.profile.record(info, time.perf_counter() - started, queries)
+        return result
+
+    async def resolve_async(self, result, info, started, queries):
+        try:
+            return await result
+        finally:
+            self.profile.record(info, time.perf_counter() - started, queries)
+
+
+def start_profile(request) -> Optional[Profile]:
+    '''A Profile for this request if it asked for one or is sampled, otherwise None'''
+    if request is not None and request.headers.get(PROFILING['HEADER']):
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            return Profile(report=True)
+    if PROFILING['SAMPLE_RATE'] and random.random() < PROFILING['SAMPLE_RATE']:
+        return Profile(report=False)
+    return None
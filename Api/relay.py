@@ -1,10 +1,14 @@
 from functools import partial
 
-from graphene.types import Interface, Field
+from graphene.types import Interface, Field, Int
+from graphene.relay.connection import Connection
 from graphene.types.interface import InterfaceOptions
 from graphene.relay.node import GlobalID
 from graphene.relay.id_type import BaseGlobalIDType, SimpleGlobalIDType
 from graphene.types.utils import get_type
+from graphene_django import DjangoObjectType
+
+from Api import objectcache
 
 class NodeField(Field):
     def __init__(self, node, type_=False, **kwargs):
@@ -81,10 +85,35 @@ class Node(AbstractNode):
                 f'ObjectType "{_type}" does not implement the "{cls}" interface.'
             )
 
+        model = getattr(graphene_type._meta, "model", None)
+        if (
+            model is not None
+            and objectcache.is_cached(model)
+            and graphene_type.get_queryset.__func__ is DjangoObjectType.get_queryset.__func__
+        ):
+            try:
+                return objectcache.get(model, pk=_id)
+            except model.DoesNotExist:
+                return None
+
         get_node = getattr(graphene_type, "get_node", None)
         if get_node:
             return get_node(info, _id)
 
     @classmethod
     def to_global_id(cls, type_, id):
-        return cls._meta.global_id_type.to_global_id(type_, id)
\ No newline at end of file
+        return cls._meta.global_id_type.to_global_id(type_, id)
+
+class CountableConnection(Connection):
+    """Connection exposing `totalCount`, counted only when it is selected."""
+
+    class Meta:
+        abstract = True
+
+    total_count = Int()
+
+    def resolve_total_count(self, info):
+        length = getattr(self, "length", None)
+        if length is None:
+            length = self.length = self.iterable.count()
+        return length
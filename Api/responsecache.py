@@ -0,0 +1,227 @@
+'''Whole responses to anonymous GET queries, cached and served with ETags.
+
+A response is cached under a digest of the printed document, its variables
+and operation name, along with the version of every model the document can
+read: the models behind the DjangoObjectTypes it selects. Saving or
+deleting an instance of one of those models bumps its version, so the next
+request for a response built from an older version executes the query
+again. Fields returning non-Django types (Search hits) are only refreshed
+when their entry expires after TIMEOUT seconds.
+
+Documents selecting a field in PRIVATE_FIELDS, whose value depends on who
+is asking, are never cached.
+'''
+import hashlib
+import json
+import threading
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from graphene_django.settings import graphene_settings
+from graphql import (
+    BREAK,
+    DocumentNode,
+    OperationType,
+    TypeInfo,
+    TypeInfoVisitor,
+    Visitor,
+    get_named_type,
+    get_operation_ast,
+    is_abstract_type,
+    print_ast,
+    visit,
+)
+
+from Api import metrics
+from Api.profiling import PROFILING
+
+RESPONSE_CACHE = {
+    'ENABLED': False,
+    'ALIAS': 'default',
+    'TIMEOUT': 60,
+    'MAX_AGE': 30,
+    'PRIVATE_FIELDS': ('clappedByMe', 'savedByMe', 'myVote', 'followed', 'MySavedStories', 'HomeFeed', 'Me'),
+    **getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {}),
+}
+
+# Number of documents whose printed form and models are remembered.
+DESCRIBED_SIZE = 1000
+
+
+class Operation(NamedTuple):
+    printed: str
+    labels: Tuple[str, ...]
+
+
+class CachedResponse(NamedTuple):
+    body: str
+    status: int
+    etag: str
+
+
+class Plan(NamedTuple):
+    key: str
+    versions: Dict[str, int]
+    cached: Optional[CachedResponse]
+
+
+requests = metrics.Counter('graphql_response_cache_requests_total', 'Response cache lookups.', ('result',))
+
+
+def cache():
+    return caches[RESPONSE_CACHE['ALIAS']]
+
+
+def version_key(label: str) -> str:
+    return f'graphql-response:{label}:version'
+
+
+def response_key(operation: Operation, operation_name, variables) -> str:
+    digest = hashlib.sha256()
+    digest.update(operation.printed.encode('utf-8'))
+    digest.update(b'\0' + (operation_name or '').encode('utf-8'))
+    digest.update(b'\0' + json.dumps(variables or {}, sort_keys=True, default=str).encode('utf-8'))
+    return f'graphql-response:{digest.hexdigest()}'
+
+
+def model_label(graphql_type) -> Optional[str]:
+    model = getattr(getattr(getattr(graphql_type, 'graphene_type', None), '_meta', None), 'model', None)
+    return model._meta.label if model is not None else None
+
+
+class ModelCollector(Visitor):
+    """Collects the models behind the fields of a document, stopping at the first private field."""
+
+    def __init__(self, schema, type_info: TypeInfo):
+        super().__init__()
+        self.schema = schema
+        self.type_info = type_info
+        self.private = set(RESPONSE_CACHE['PRIVATE_FIELDS'])
+        self.labels = set()
+        self.is_private = False
+
+    def enter_field(self, node, *args):
+        if node.name.value in self.private:
+            self.is_private = True
+            return BREAK
+        named_type = get_named_type(self.type_info.get_type())
+        if named_type is None:
+            return None
+        types = self.schema.get_possible_types(named_type) if is_abstract_type(named_type) else (named_type,)
+        for graphql_type in types:
+            label = model_label(graphql_type)
+            if label is not None:
+                self.labels.add(label)
+        return None
+
+
+@lru_cache(maxsize=None)
+def schema_labels() -> frozenset:
+    '''Labels of the models behind the types of the schema'''
+    types = graphene_settings.SCHEMA.graphql_schema.type_map.values()
+    return frozenset(label for label in map(model_label, types) if label is not None)
+
+
+_described: Dict[int, Tuple[DocumentNode, Optional[Operation]]] = {}
+_described_lock = threading.Lock()
+
+
+def describe(schema, document: DocumentNode) -> Optional[Operation]:
+    '''The printed form and models read by `document`, or None when it selects a private field'''
+    entry = _described.get(id(document))
+    if entry is not None and entry[0] is document:
+        return entry[1]
+    type_info = TypeInfo(schema)
+    collector = ModelCollector(schema, type_info)
+    visit(document, TypeInfoVisitor(type_info, collector))
+    operation = None if collector.is_private else Operation(print_ast(document), tuple(sorted(collector.labels)))
+    with _described_lock:
+        if len(_described) >= DESCRIBED_SIZE:
+            _described.clear()
+        _described[id(document)] = (document, operation)
+    return operation
+
+
+def lookup(request, schema, document, operation_name, variables) -> Optional[Plan]:
+    '''Where the response to this request is cached and the response if it is, or None when it can not be cached'''
+    if not RESPONSE_CACHE['ENABLED'] or request.method != 'GET' or request.headers.get(PROFILING['HEADER']):
+        return None
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return None
+    operation_ast = get_operation_ast(document, operation_name)
+    if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return None
+    operation = describe(schema, document)
+    if operation is None:
+        return None
+
+    key = response_key(operation, operation_name, variables)
+    found = cache().get_many([key, *(version_key(label) for label in operation.labels)])
+    versions = {label: found.get(version_key(label), 0) for label in operation.labels}
+    entry = found.get(key)
+    if entry is None:
+        requests.inc(result='miss')
+        return Plan(key, versions, None)
+    if entry[0] != versions:
+        requests.inc(result='stale')
+        return Plan(key, versions, None)
+    requests.inc(result='hit')
+    return Plan(key, versions, entry[1])
+
+
+def store(plan: Plan, body, status: int) -> CachedResponse:
+    '''Cache `body` as the response for `plan`'''
+    content = body if isinstance(body, bytes) else body.encode('utf-8')
+    response = CachedResponse(body, status, quote_etag(hashlib.sha1(content).hexdigest()))
+    cache().set(plan.key, (plan.versions, response), RESPONSE_CACHE['TIMEOUT'])
+    return response
+
+
+def add_headers(request, response, cached: Optional[CachedResponse]):
+    '''Mark `response` cacheable when it was built from `cached`, answering 304 when the client already has it'''
+    if not RESPONSE_CACHE['ENABLED'] or request.method != 'GET':
+        return response
+    if cached is None or response.status_code != 200:
+        patch_cache_control(response, private=True)
+        return response
+    response['ETag'] = cached.etag
+    patch_cache_control(response, public=True, max_age=RESPONSE_CACHE['MAX_AGE'])
+    return get_conditional_response(request, etag=cached.etag, response=response) or response
+
+
+def invalidate(model) -> None:
+    '''Stop serving cached responses that read `model` once the current transaction commits'''
+    if not RESPONSE_CACHE['ENABLED'] or model._meta.label not in schema_labels():
+        return
+    key = version_key(model._meta.label)
+
+    def bump():
+        cache().add(key, 0, None)
+        try:
+            cache().incr(key)
+        except ValueError:
+            cache().set(key, 1, None)
+    transaction.on_commit(bump)
+
+
+def instance_changed(sender, **kwargs):
+    invalidate(sender)
+
+
+def relation_changed(sender, instance, action, model, **kwargs):
+    if action.startswith('post_'):
+        invalidate(type(instance))
+        invalidate(model)
+
+
+def connect_signals():
+    post_save.connect(instance_changed, dispatch_uid='responsecache:save')
+    post_delete.connect(instance_changed, dispatch_uid='responsecache:delete')
+    m2m_changed.connect(relation_changed, dispatch_uid='responsecache:m2m')
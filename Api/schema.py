@@ -1,38 +1,35 @@
 from graphene import ObjectType, String, Schema, List
 from graphene_django import DjangoObjectType
-import asyncio
 from User.schema import Query as UserQuery, Mutation as UserMutation
 from Creator.schema import Query as CreatorQuery, Mutation as CreatorMutation
 from Content.schema import Query as ContentQuery, Mutation as ContentMutation
 from Common.schema import Query as CommonQuery, Mutation as CommonMutation
+from Search.schema import Query as SearchQuery
 
+from Api.incremental import directives
 from Api.subscriptions import Subscription as ApiSubscription, MySubscription
+from Content.subscriptions import Subscription as ContentSubscription
 
 
-class Query(UserQuery, CreatorQuery, ContentQuery, CommonQuery):
+class Query(UserQuery, CreatorQuery, ContentQuery, CommonQuery, SearchQuery):
     hello = String(name=String(default_value="stranger"))
     yellow = List(String)
 
     def resolve_hello(self, info, name):
-        i = 0
-        while i < 200:
-            i += 1
-            MySubscription.broadcast(group="my_subscription", payload={"value": i})
-            asyncio.sleep(1)
+        for i in range(1, 201):
+            MySubscription.enqueue(group="my_subscription", payload={"value": i})
         return f"Hello, {name}!"
-    
+
     async def resolve_yellow(self, info):
-        i = 0
-        while i < 200:
-            i += 1
-            await MySubscription.broadcast_async(group="my_subscription", payload={"value": f'yellow {i}'})
+        for i in range(1, 201):
+            await MySubscription.enqueue_async(group="my_subscription", payload={"value": f'yellow {i}'})
         return ["yellow"]
 
 class Mutation(UserMutation, CreatorMutation, ContentMutation, CommonMutation):
     pass
 
-class Subscription(ApiSubscription):
+class Subscription(ApiSubscription, ContentSubscription):
     """Root GraphQL subscription."""
     pass
 
-schema = Schema(query=Query, mutation=Mutation, subscription=Subscription)
\ No newline at end of file
+schema = Schema(query=Query, mutation=Mutation, subscription=Subscription, directives=directives)
\ No newline at end of file
@@ -1,7 +1,10 @@
 import channels_graphql_ws
 import graphene
 
-class MySubscription(channels_graphql_ws.Subscription):
+from Api.broadcast import BatchedBroadcast
+
+
+class MySubscription(BatchedBroadcast, channels_graphql_ws.Subscription):
     """Simple GraphQL subscription."""
 
     # Leave only latest 64 messages in the server queue.
@@ -25,7 +28,7 @@ class MySubscription(channels_graphql_ws.Subscription):
         """Called to notify the client."""
 
         # Here `payload` contains the `payload` from the `broadcast()`
-        # invocation (see below). You can return `None` if you wish to
+        # or `enqueue()` invocation (see Api.schema). You can return `None` if you wish to
         # suppress the notification to a particular client. For example,
         # this allows to avoid notifications for the actions made by
         # this particular client.
@@ -1,3 +1,28 @@
-from django.test import TestCase
+import asyncio
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from Api.broker import Broker
+from Api.layers import BrokerChannelLayer
+
+
+class BrokerChannelLayerTest(SimpleTestCase):
+    """Messages reach a channel through an in-process broker."""
+
+    async def test_group_send_after_discarding_another_group(self):
+        broker = Broker()
+        server = await asyncio.start_server(broker.handle, '127.0.0.1', 0)
+        layer = BrokerChannelLayer(port=server.sockets[0].getsockname()[1], batch_interval=0)
+        try:
+            channel = await layer.new_channel()
+            receiving = asyncio.ensure_future(asyncio.wait_for(layer.receive(channel), timeout=2))
+            await layer.group_add('a', channel)
+            await layer.group_add('b', channel)
+            await layer.group_discard('a', channel)
+            await asyncio.sleep(0.05)
+            await layer.group_send('b', {'type': 'test.message', 'text': 'hello'})
+            self.assertEqual(await receiving, {'type': 'test.message', 'text': 'hello'})
+        finally:
+            await layer.close()
+            server.close()
+            await server.wait_closed()
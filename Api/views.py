@@ -2,6 +2,10 @@ from django.shortcuts import render
 from cloudinary.uploader import upload_image, destroy
 from django.http import JsonResponse
 
+from Api.metrics import timed_view, view_requests
+
+
+@timed_view(view_requests, 'image_upload')
 def image_upload(request):
     if request.method == 'POST':
         image = request.FILES.get('image', None)
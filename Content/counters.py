@@ -0,0 +1,66 @@
+from typing import Dict, Iterable, NamedTuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from Api import objectcache, responsecache
+
+from Content.models import (
+    Story, StoryClap, StoryComment, StoryCommentVote,
+    Post, PostClap, PostComment, PostCommentVote, PostPoll, PostPollVote,
+)
+
+
+def increment(model, pk, **deltas):
+    '''Atomically add `deltas` to counter columns of one row, never going below zero'''
+    updates = {field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items() if delta}
+    if updates:
+        model.objects.filter(pk=pk).update(**updates)
+        objectcache.invalidate(model, pk)
+        responsecache.invalidate(model)
+
+
+def toggle(model, **lookup):
+    '''Delete the row matching `lookup`, or insert it when there was none.
+
+    `lookup` must be covered by a unique constraint, so two concurrent toggles
+    cannot both insert; the loser sees the row as already there. Returns the
+    change in row count (-1, 0 or 1). Call inside a transaction together with
+    the matching `increment`.'''
+    deleted, _ = model.objects.filter(**lookup).delete()
+    if deleted:
+        return -deleted
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup)
+    except IntegrityError:
+        return 0
+    return 1
+
+
+class Counter(NamedTuple):
+    '''A denormalized counter column and the rows it counts'''
+    model: type
+    field: str
+    source: type
+    fk: str
+    filters: dict = {}
+
+    def count(self, keys: Iterable) -> Dict:
+        rows = (self.source.objects.filter(**self.filters, **{f'{self.fk}__in': keys})
+                .values(self.fk).annotate(count=Count('pk')).order_by())
+        return {row[self.fk]: row['count'] for row in rows}
+
+
+COUNTERS = [
+    Counter(Story, 'claps_count', StoryClap, 'story_id'),
+    Counter(Story, 'comments_count', StoryComment, 'story_id', {'parent': None}),
+    Counter(StoryComment, 'reply_count', StoryComment, 'parent_id'),
+    Counter(StoryComment, 'votes_count', StoryCommentVote, 'comment_id'),
+    Counter(Post, 'claps_count', PostClap, 'post_id'),
+    Counter(Post, 'comments_count', PostComment, 'post_id', {'parent': None}),
+    Counter(PostComment, 'reply_count', PostComment, 'parent_id'),
+    Counter(PostComment, 'votes_count', PostCommentVote, 'comment_id'),
+    Counter(PostPoll, 'votes_count', PostPollVote, 'poll_id'),
+]
@@ -0,0 +1,77 @@
+from django.db.models import Count, Q
+
+from Api.loaders import BatchLoader
+from Content.models import (
+    Story, StoryClap, StoryComment, StoryCommentVote,
+    Post, PostClap, PostComment, PostCommentVote, PostPoll, PostPollVote,
+)
+from User.models import User
+
+
+def keys_with(queryset, field, keys):
+    return {key: True for key in queryset.filter(**{f'{field}__in': keys}).values_list(field, flat=True)}
+
+
+'''****************** STORY LOADERS ******************'''
+
+class StoryClappedByMeLoader(BatchLoader):
+    model = Story
+    default = False
+
+    def batch_load(self, keys):
+        return keys_with(StoryClap.objects.filter(user=self.user), 'story_id', keys)
+
+class StorySavedByMeLoader(BatchLoader):
+    model = Story
+    default = False
+
+    def batch_load(self, keys):
+        return keys_with(User.saved_stories.through.objects.filter(user=self.user), 'story_id', keys)
+
+class StoryCommentMyVoteLoader(BatchLoader):
+    model = StoryComment
+
+    def batch_load(self, keys):
+        votes = StoryCommentVote.objects.filter(user=self.user, comment_id__in=keys)
+        return dict(votes.values_list('comment_id', 'id'))
+
+
+'''****************** POST LOADERS ******************'''
+
+class PostClappedByMeLoader(BatchLoader):
+    model = Post
+    default = False
+
+    def batch_load(self, keys):
+        return keys_with(PostClap.objects.filter(user=self.user), 'post_id', keys)
+
+class PostSavedByMeLoader(BatchLoader):
+    model = Post
+    default = False
+
+    def batch_load(self, keys):
+        return keys_with(User.saved_posts.through.objects.filter(user=self.user), 'post_id', keys)
+
+class PostCommentMyVoteLoader(BatchLoader):
+    model = PostComment
+
+    def batch_load(self, keys):
+        votes = PostCommentVote.objects.filter(user=self.user, comment_id__in=keys)
+        return dict(votes.values_list('comment_id', 'id'))
+
+class PollTallyLoader(BatchLoader):
+    '''Votes per option and the current user's vote of each poll, read with
+    one GROUP BY over every queued poll'''
+    model = PostPoll
+    default = ({}, None)
+
+    def batch_load(self, keys):
+        user_id = self.user.pk if self.user and self.user.is_authenticated else None
+        rows = (PostPollVote.objects.filter(poll_id__in=keys).values('poll_id', 'option')
+                .annotate(votes=Count('pk'), mine=Count('pk', filter=Q(user_id=user_id))).order_by())
+        results = {}
+        for row in rows:
+            tally, my_vote = results.get(row['poll_id'], ({}, None))
+            tally[row['option']] = row['votes']
+            results[row['poll_id']] = (tally, row['option'] if row['mine'] else my_vote)
+        return results
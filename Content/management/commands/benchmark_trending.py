@@ -0,0 +1,76 @@
+import heapq
+import math
+import random
+import time
+from collections import defaultdict
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Content import trending
+from Content.models import Story
+
+
+class Command(BaseCommand):
+    help = 'Benchmark incremental trending scores against recomputing them from the events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000)
+        parser.add_argument('--items', type=int, default=10_000)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--db-events', type=int, default=0,
+                            help='Also time this many score updates against existing stories, rolled back afterwards.')
+
+    def report(self, label, seconds, count=None):
+        rate = f' ({count / seconds:,.0f}/s)' if count and seconds else ''
+        self.stdout.write(f'{label:<40} {seconds * 1000:>10.1f} ms{rate}')
+
+    def handle(self, *args, events, items, top, seed, db_events, **options):
+        rng = random.Random(seed)
+        now = timezone.now()
+        window = trending.WINDOW.total_seconds()
+        epoch = now - trending.WINDOW
+        # Popularity follows a power law, as engagement does.
+        stream = sorted(
+            (now - timezone.timedelta(seconds=rng.random() * window),
+             int(items * rng.random() ** 3),
+             'comment' if rng.random() < 0.2 else 'clap')
+            for _ in range(events)
+        )
+
+        started = time.perf_counter()
+        scores = defaultdict(float)
+        for when, item, kind in stream:
+            scores[item] += trending.weight_at(kind, when, epoch)
+        self.report(f'incremental, {events:,} events', time.perf_counter() - started, events)
+
+        started = time.perf_counter()
+        incremental = [item for item, _ in heapq.nlargest(top, scores.items(), key=itemgetter(1))]
+        self.report(f'read top {top} from stored scores', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        decayed = defaultdict(float)
+        for when, item, kind in stream:
+            decayed[item] += trending.WEIGHTS[kind] * math.exp(-(now - when).total_seconds() / trending.TAU)
+        recomputed = [item for item, _ in heapq.nlargest(top, decayed.items(), key=itemgetter(1))]
+        self.report(f'recompute top {top} per read', time.perf_counter() - started, events)
+
+        self.stdout.write(f'rankings match: {incremental == recomputed}')
+
+        if db_events:
+            keys = list(Story.objects.values_list('pk', flat=True)[:items])
+            if not keys:
+                self.stdout.write('No stories to update, skipping the database benchmark.')
+                return
+            with transaction.atomic():
+                started = time.perf_counter()
+                for _ in range(db_events):
+                    trending.record(Story, rng.choice(keys), 'clap')
+                self.report(f'database, {db_events:,} updates', time.perf_counter() - started, db_events)
+                started = time.perf_counter()
+                list(trending.trending(Story.objects.all()).order_by('-trending_score', '-key').values_list('pk', flat=True)[:top])
+                self.report(f'database, read top {top}', time.perf_counter() - started)
+                transaction.set_rollback(True)
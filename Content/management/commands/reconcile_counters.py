@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Api import objectcache, responsecache
+from Content.counters import COUNTERS
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized claps, comments, replies and votes counters and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing it.')
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        for counter in COUNTERS:
+            model, field = counter.model, counter.field
+            pk_name = model._meta.pk.name
+            checked = fixed = 0
+            last_pk = None
+            while True:
+                rows = model.objects.order_by(pk_name)
+                if last_pk is not None:
+                    rows = rows.filter(pk__gt=last_pk)
+                batch = list(rows.values_list(pk_name, field)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                actual = counter.count([pk for pk, _ in batch])
+                drifted = [
+                    model(**{pk_name: pk, field: actual.get(pk, 0)})
+                    for pk, stored in batch if stored != actual.get(pk, 0)
+                ]
+                checked += len(batch)
+                fixed += len(drifted)
+                if drifted and not dry_run:
+                    with transaction.atomic():
+                        model.objects.bulk_update(drifted, [field], batch_size=batch_size)
+            if fixed and not dry_run:
+                objectcache.invalidate_model(model._meta.label)
+                responsecache.invalidate(model)
+            self.stdout.write(
+                f'{model._meta.label}.{field}: {checked} checked, {fixed} '
+                f'{"drifted" if dry_run else "fixed"}'
+            )
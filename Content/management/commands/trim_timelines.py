@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from Content.models import TimelineEntry
+from Content.timeline import MAX_AGE, MAX_ENTRIES
+
+
+class Command(BaseCommand):
+    help = 'Delete timeline entries older than TIMELINE_MAX_AGE_DAYS or beyond TIMELINE_MAX_ENTRIES per user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def delete_in_batches(self, entries, batch_size):
+        deleted = 0
+        while True:
+            batch = list(entries.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += TimelineEntry.objects.filter(pk__in=batch).delete()[0]
+
+    def handle(self, *args, batch_size, **options):
+        cutoff = timezone.now() - MAX_AGE
+        expired = self.delete_in_batches(TimelineEntry.objects.filter(published_at__lt=cutoff), batch_size)
+
+        trimmed = 0
+        over = (TimelineEntry.objects.values('user').annotate(entries=Count('pk'))
+                .filter(entries__gt=MAX_ENTRIES).values_list('user', flat=True).order_by())
+        for user in over.iterator():
+            entries = TimelineEntry.objects.filter(user=user)
+            published_at, pk = entries.order_by('-published_at', '-id').values_list('published_at', 'id')[MAX_ENTRIES]
+            older = entries.filter(Q(published_at__lt=published_at) | Q(published_at=published_at, id__lte=pk))
+            trimmed += self.delete_in_batches(older, batch_size)
+
+        self.stdout.write(f'{expired} expired and {trimmed} overflowing timeline entries deleted')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Content import trending
+
+
+class Command(BaseCommand):
+    help = 'Rebase the trending epoch when due and recompute trending scores from recent claps and comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=trending.BATCH_SIZE)
+        parser.add_argument('--rebase', action='store_true', help='Rebase the epoch even if it is not due.')
+
+    def handle(self, *args, batch_size, rebase, **options):
+        now = timezone.now()
+        if rebase or now - trending.get_epoch() > trending.REBASE_AFTER:
+            trending.rebase(now)
+            self.stdout.write(f'Epoch rebased to {now.isoformat()}')
+        for model in trending.EVENTS:
+            changed = trending.rerank(model, now=now, batch_size=batch_size)
+            self.stdout.write(f'{model._meta.label}: {changed} scores updated')
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+COUNTERS = [
+    ('Story', 'claps_count', 'StoryClap', 'story_id', {}),
+    ('Story', 'comments_count', 'StoryComment', 'story_id', {'parent': None}),
+    ('StoryComment', 'reply_count', 'StoryComment', 'parent_id', {}),
+    ('StoryComment', 'votes_count', 'StoryCommentVote', 'comment_id', {}),
+    ('Post', 'claps_count', 'PostClap', 'post_id', {}),
+    ('Post', 'comments_count', 'PostComment', 'post_id', {'parent': None}),
+    ('PostComment', 'reply_count', 'PostComment', 'parent_id', {}),
+    ('PostComment', 'votes_count', 'PostCommentVote', 'comment_id', {}),
+    ('PostPoll', 'votes_count', 'PostPollVote', 'poll_id', {}),
+]
+
+def backfill_counters(apps, schema_editor):
+    for model_name, field, source_name, fk, filters in COUNTERS:
+        model = apps.get_model('Content', model_name)
+        source = apps.get_model('Content', source_name)
+        rows = source.objects.filter(**filters).values(fk).annotate(count=Count('pk')).order_by()
+        for row in rows.iterator():
+            model.objects.filter(pk=row[fk]).update(**{field: row['count']})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0010_remove_postimage_new_images_alter_postimage_images_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='claps_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='votes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='postpoll',
+            name='votes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='claps_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='storycomment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='storycomment',
+            name='votes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
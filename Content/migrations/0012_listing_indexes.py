@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_claps(apps, schema_editor):
+    Story = apps.get_model('Content', 'Story')
+    StoryClap = apps.get_model('Content', 'StoryClap')
+    duplicates = (
+        StoryClap.objects.values('user', 'story').annotate(keep=Min('pk'), count=Count('pk')).filter(count__gt=1).order_by()
+    )
+    stories = set()
+    for row in list(duplicates):
+        StoryClap.objects.filter(user=row['user'], story=row['story']).exclude(pk=row['keep']).delete()
+        stories.add(row['story'])
+    # 0011 counted the duplicates into claps_count.
+    for story in stories:
+        Story.objects.filter(pk=story).update(claps_count=StoryClap.objects.filter(story=story).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['state', 'privacy', 'is_deleted', 'published_at', 'key'], name='posts_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', 'parent', 'created_at', 'id'], name='post_comments_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['state', 'privacy', 'is_deleted', 'published_at', 'key'], name='stories_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storycomment',
+            index=models.Index(fields=['story', 'parent', 'created_at', 'id'], name='story_comments_thread_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_claps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='storyclap',
+            constraint=models.UniqueConstraint(fields=('user', 'story'), name='story_claps_user_story_uniq'),
+        ),
+    ]
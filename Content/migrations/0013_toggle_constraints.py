@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+DEDUPLICATED = [
+    ('PostClap', 'post', 'Post', 'claps_count'),
+    ('StoryCommentVote', 'comment', 'StoryComment', 'votes_count'),
+    ('PostCommentVote', 'comment', 'PostComment', 'votes_count'),
+]
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name, target, target_model_name, counter in DEDUPLICATED:
+        model = apps.get_model('Content', model_name)
+        target_model = apps.get_model('Content', target_model_name)
+        duplicates = (
+            model.objects.values('user', target).annotate(keep=Min('pk'), count=Count('pk')).filter(count__gt=1).order_by()
+        )
+        targets = set()
+        for row in list(duplicates):
+            model.objects.filter(user=row['user'], **{target: row[target]}).exclude(pk=row['keep']).delete()
+            targets.add(row[target])
+        # 0011 counted the duplicates into the counter.
+        for pk in targets:
+            target_model.objects.filter(pk=pk).update(**{counter: model.objects.filter(**{target: pk}).count()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0012_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='postclap',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='post_claps_user_post_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='storycommentvote',
+            constraint=models.UniqueConstraint(fields=('user', 'comment'), name='story_comment_votes_user_comment_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='postcommentvote',
+            constraint=models.UniqueConstraint(fields=('user', 'comment'), name='post_comment_votes_user_comment_uniq'),
+        ),
+    ]
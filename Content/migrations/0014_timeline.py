@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0013_toggle_constraints'),
+        ('Creator', '0004_creatorfollower_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.CharField(editable=False, max_length=40, primary_key=True, serialize=False, unique=True)),
+                ('published_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Creator.creator')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Content.post')),
+                ('story', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Content.story')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'timeline entry',
+                'verbose_name_plural': 'timeline entries',
+                'db_table': 'timeline_entries',
+                'indexes': [models.Index(fields=['user', 'published_at', 'id'], name='timeline_user_published_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'story'), name='timeline_user_story_uniq'), models.UniqueConstraint(fields=('user', 'post'), name='timeline_user_post_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+PATH_SEGMENT = 10
+MAX_PATH_DEPTH = 20
+
+
+def fill_paths(apps, schema_editor):
+    for model_name in ('StoryComment', 'PostComment'):
+        model = apps.get_model('Content', model_name)
+        parents = {None: ('', -1)}
+        level = list(model.objects.filter(parent=None).values_list('pk', 'parent_id'))
+        while level:
+            changed = []
+            for pk, parent_id in level:
+                path, depth = parents[parent_id]
+                if depth < MAX_PATH_DEPTH:
+                    path += pk[:PATH_SEGMENT] + '/'
+                parents[pk] = (path, depth + 1)
+                changed.append(model(pk=pk, path=parents[pk][0], depth=parents[pk][1]))
+            model.objects.bulk_update(changed, ['path', 'depth'], batch_size=1000)
+            keys = [pk for pk, _ in level]
+            level = []
+            for start in range(0, len(keys), 1000):
+                level += model.objects.filter(parent_id__in=keys[start:start + 1000]).values_list('pk', 'parent_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0015_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postcomment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='storycomment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='storycomment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', 'path'], name='post_comments_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storycomment',
+            index=models.Index(fields=['story', 'path'], name='story_comments_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+from Content.text import excerpt, plain_text, reading_time
+
+
+def fill_summaries(apps, schema_editor):
+    Story = apps.get_model('Content', 'Story')
+    changed = []
+    for story in Story.objects.only('key', 'content').iterator(chunk_size=500):
+        text = plain_text(story.content)
+        story.excerpt, story.reading_time = excerpt(text), reading_time(text)
+        changed.append(story)
+        if len(changed) >= 500:
+            Story.objects.bulk_update(changed, ['excerpt', 'reading_time'])
+            changed = []
+    if changed:
+        Story.objects.bulk_update(changed, ['excerpt', 'reading_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0016_comment_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Minutes'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
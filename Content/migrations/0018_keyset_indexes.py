@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Content', '0017_story_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['published_at', 'key'], name='posts_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['parent', 'created_at', 'id'], name='post_comments_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['published_at', 'key'], name='stories_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storycomment',
+            index=models.Index(fields=['parent', 'created_at', 'id'], name='story_comments_created_idx'),
+        ),
+    ]
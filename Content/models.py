@@ -1,8 +1,47 @@
 from django.db import models
 from nanoid import generate
 
+from Content.text import excerpt, plain_text, reading_time
+
 # Create your models here.
-class Story(models.Model):
+class CounterModel(models.Model):
+    '''Model with denormalized counters that are only written through F() updates'''
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A full save would write back stale counters, so leave them out,
+        # along with deferred columns as a plain save would.
+        if self.counter_fields and not self._state.adding and not kwargs.get('update_fields'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred
+            ]
+        return super().save(*args, **kwargs)
+
+
+# Comments store the path of their ancestors' ids, so a whole thread is one
+# `path LIKE 'prefix%'` range scan. Each level takes PATH_SEGMENT + 1 chars,
+# and replies below MAX_PATH_DEPTH keep their parent's path so it still fits.
+PATH_SEGMENT = 10
+MAX_PATH_DEPTH = 20
+
+
+def set_thread_path(comment):
+    '''Fill the path and depth of a new comment from its parent'''
+    segment = comment.id[:PATH_SEGMENT] + '/'
+    if comment.parent_id:
+        parent = comment.parent
+        path = parent.path + segment if parent.depth < MAX_PATH_DEPTH else parent.path
+        comment.path, comment.depth = path, parent.depth + 1
+    else:
+        comment.path, comment.depth = segment, 0
+
+
+class Story(CounterModel):
     slug = models.SlugField(max_length=255, unique=True)
     key = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
     title = models.CharField(max_length=255, blank=True)
@@ -29,11 +68,24 @@ class Story(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    claps_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    # Filled from `content` on save, so story cards never load it.
+    excerpt = models.CharField(max_length=300, blank=True, default='', editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text='Minutes')
+
+    counter_fields = ('claps_count', 'comments_count', 'trending_score')
 
     class Meta:
         db_table = 'stories'
         verbose_name = 'story'
         verbose_name_plural = 'stories'
+        indexes = [
+            models.Index(fields=['state', 'privacy', 'is_deleted', 'published_at', 'key'], name='stories_listing_idx'),
+            models.Index(fields=['published_at', 'key'], name='stories_published_idx'),
+            models.Index(fields=['state', 'privacy', 'is_deleted', 'trending_score', 'key'], name='stories_trending_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -41,8 +93,19 @@ class Story(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk:
             self.key = generate(size=28)
+        update_fields = kwargs.get('update_fields')
+        if 'content' not in self.get_deferred_fields() and (update_fields is None or 'content' in update_fields):
+            self.set_summary()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt', 'reading_time'}
         super().save(*args, **kwargs)
         return self
+
+    def set_summary(self):
+        '''Fill excerpt and reading_time from the content'''
+        text = plain_text(self.content)
+        self.excerpt = excerpt(text)
+        self.reading_time = reading_time(text)
     
 
 class StoryClap(models.Model):
@@ -56,6 +119,9 @@ class StoryClap(models.Model):
         db_table = 'story_claps'
         verbose_name = 'story clap'
         verbose_name_plural = 'story claps'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'story'], name='story_claps_user_story_uniq'),
+        ]
     
     def __str__(self):
         return self.id
@@ -66,7 +132,7 @@ class StoryClap(models.Model):
         super().save(*args, **kwargs)
         return self
     
-class StoryComment(models.Model):
+class StoryComment(CounterModel):
     id = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
     story = models.ForeignKey('Story', on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey('User.User', on_delete=models.CASCADE, related_name='story_comments')
@@ -77,11 +143,22 @@ class StoryComment(models.Model):
     updated_at = models.DateTimeField(null=True, blank=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    reply_count = models.PositiveIntegerField(default=0)
+    votes_count = models.PositiveIntegerField(default=0)
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     
+    counter_fields = ('reply_count', 'votes_count')
+
     class Meta:
         db_table = 'story_comments'
         verbose_name = 'story comment'
         verbose_name_plural = 'story comments'
+        indexes = [
+            models.Index(fields=['story', 'parent', 'created_at', 'id'], name='story_comments_thread_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='story_comments_created_idx'),
+            models.Index(fields=['story', 'path'], name='story_comments_path_idx'),
+        ]
     
     def __str__(self):
         return self.id
@@ -89,6 +166,7 @@ class StoryComment(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk:  
             self.id = generate(size=40)
+            set_thread_path(self)
         super().save(*args, **kwargs)
         return self
     
@@ -116,6 +194,9 @@ class StoryCommentVote(models.Model):
         db_table = 'story_comment_votes'
         verbose_name = 'story comment vote'
         verbose_name_plural = 'story comment votes'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'comment'], name='story_comment_votes_user_comment_uniq'),
+        ]
     
     def __str__(self):
         return self.id
@@ -128,7 +209,7 @@ class StoryCommentVote(models.Model):
     
 
 
-class Post(models.Model):
+class Post(CounterModel):
     key = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
     text = models.TextField(blank=True, null=True)
     type_of = models.CharField(max_length=20, default='text', choices=[
@@ -160,11 +241,21 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    claps_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+
+    counter_fields = ('claps_count', 'comments_count', 'trending_score')
 
     class Meta:
         db_table = 'posts'
         verbose_name = 'post'
         verbose_name_plural = 'posts'
+        indexes = [
+            models.Index(fields=['state', 'privacy', 'is_deleted', 'published_at', 'key'], name='posts_listing_idx'),
+            models.Index(fields=['published_at', 'key'], name='posts_published_idx'),
+            models.Index(fields=['state', 'privacy', 'is_deleted', 'trending_score', 'key'], name='posts_trending_idx'),
+        ]
     
     def __str__(self):
         return self.key
@@ -187,6 +278,9 @@ class PostClap(models.Model):
         db_table = 'post_claps'
         verbose_name = 'post clap'
         verbose_name_plural = 'post claps'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='post_claps_user_post_uniq'),
+        ]
     
     def __str__(self):
         return self.id
@@ -198,7 +292,7 @@ class PostClap(models.Model):
         return self
     
 
-class PostComment(models.Model):
+class PostComment(CounterModel):
     id = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
     post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name="comments")
     user = models.ForeignKey('User.User', on_delete=models.CASCADE, related_name="post_comments")
@@ -209,11 +303,22 @@ class PostComment(models.Model):
     updated_at = models.DateTimeField(null=True, blank=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    reply_count = models.PositiveIntegerField(default=0)
+    votes_count = models.PositiveIntegerField(default=0)
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     
+    counter_fields = ('reply_count', 'votes_count')
+
     class Meta:
         db_table = 'post_comments'
         verbose_name = 'post comment'
         verbose_name_plural = 'post comments'
+        indexes = [
+            models.Index(fields=['post', 'parent', 'created_at', 'id'], name='post_comments_thread_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='post_comments_created_idx'),
+            models.Index(fields=['post', 'path'], name='post_comments_path_idx'),
+        ]
     
     def __str__(self):
         return self.id
@@ -221,6 +326,7 @@ class PostComment(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk:
             self.id = generate(size=40)
+            set_thread_path(self)
         super().save(*args, **kwargs)
         return self
     
@@ -249,6 +355,9 @@ class PostCommentVote(models.Model):
         db_table = 'post_comment_votes'
         verbose_name = 'post comment vote'
         verbose_name_plural = 'post comment votes'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'comment'], name='post_comment_votes_user_comment_uniq'),
+        ]
     
     def __str__(self):
         return self.id
@@ -260,13 +369,16 @@ class PostCommentVote(models.Model):
         return self
     
 
-class PostPoll(models.Model):
+class PostPoll(CounterModel):
     id = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
     question = models.CharField(max_length=255)
     options = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    votes_count = models.PositiveIntegerField(default=0)
     
+    counter_fields = ('votes_count',)
+
     class Meta:
         db_table = 'post_polls'
         verbose_name = 'post poll'
@@ -412,3 +524,48 @@ class PostImage(models.Model):
         super().save(*args, **kwargs)
         return self
     
+
+
+class TimelineEntry(models.Model):
+    '''A Story or Post in the home feed of a user following its author'''
+    id = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
+    user = models.ForeignKey('User.User', on_delete=models.CASCADE, related_name='timeline')
+    author = models.ForeignKey('Creator.Creator', on_delete=models.CASCADE, related_name='+')
+    story = models.ForeignKey('Story', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    published_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'timeline_entries'
+        verbose_name = 'timeline entry'
+        verbose_name_plural = 'timeline entries'
+        indexes = [
+            models.Index(fields=['user', 'published_at', 'id'], name='timeline_user_published_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'story'], name='timeline_user_story_uniq'),
+            models.UniqueConstraint(fields=['user', 'post'], name='timeline_user_post_uniq'),
+        ]
+
+    def __str__(self):
+        return self.id
+
+    def save(self, *args, **kwargs):
+        if not self.pk:
+            self.id = generate(size=40)
+        super().save(*args, **kwargs)
+        return self
+
+
+class TrendingEpoch(models.Model):
+    '''Reference time of the stored trending scores, see Content.trending'''
+    epoch = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'trending_epoch'
+        verbose_name = 'trending epoch'
+        verbose_name_plural = 'trending epoch'
+
+    def __str__(self):
+        return self.epoch.isoformat()
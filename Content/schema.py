@@ -1,11 +1,14 @@
 from urllib.parse import quote_plus
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from Common.schema import ImageObject
-from Content.models import Story, Post, PostPoll, PostImage, PostPollVote, StoryComment, StoryCommentVote, PostComment, PostCommentVote, StoryClap, PostClap
-from Api import relay
+from Content.models import Story, Post, PostPoll, PostImage, PostPollVote, StoryComment, StoryCommentVote, PostComment, PostCommentVote, StoryClap, PostClap, TimelineEntry
+from Api import objectcache, relay
+from Api.fields import ConnectionField, KeysetConnectionField
+from Api.relay import CountableConnection
+from Api.loaders import get_loader
 from Creator.models import Creator
+from User.models import User
 from nanoid import generate
 from Content.types import PostCommentFilter, StoryCommentFilter, StoryUpdateInput, PostInput, PostPollOptionInput, PostPollOptionObject
 from Common.models import Category, Tag
@@ -13,6 +16,15 @@ from datetime import datetime
 from User.Utils.tools import ImageHandler
 from Common.types import ImageInput
 from django.db import router
+from django.db import transaction
+from Content.counters import increment, toggle
+from Content import timeline, trending
+from Content.loaders import (
+    StoryClappedByMeLoader, StorySavedByMeLoader, StoryCommentMyVoteLoader,
+    PostClappedByMeLoader, PostSavedByMeLoader, PostCommentMyVoteLoader, PollTallyLoader,
+)
+from Content.threads import load_thread
+from Content.subscriptions import story_activity, post_activity, poll_tally
 
 
 class StoryObject(DjangoObjectType):
@@ -33,26 +45,21 @@ class StoryObject(DjangoObjectType):
         }
         fields = '__all__'
         use_connection = True
+        connection_class = CountableConnection
 
     comments_count = graphene.Int()
     claps_count = graphene.Int()
     clapped_by_me = graphene.Boolean()
     saved_by_me = graphene.Boolean()
 
-    def resolve_comments_count(self, info):
-        return self.comments.filter(parent=None).count()
-    
-    def resolve_claps_count(self, info):
-        return self.claps.count()
-    
     def resolve_clapped_by_me(self, info):
         if info.context.user.is_authenticated:
-            return self.claps.filter(user=info.context.user).exists()
+            return get_loader(info, StoryClappedByMeLoader).load(self.key)
         else: return False
 
     def resolve_saved_by_me(self, info):
         if info.context.user.is_authenticated:
-            return info.context.user.saved_stories.filter(key=self.key).exists()
+            return get_loader(info, StorySavedByMeLoader).load(self.key)
         else: return False
 
     def resolve_image(self, info):
@@ -77,21 +84,26 @@ class StoryCommentObject(DjangoObjectType):
         filterset_class = StoryCommentFilter
         fields = '__all__'
         use_connection = True
+        connection_class = CountableConnection
 
     votes = graphene.Int()
     my_vote = graphene.String()
     reply_count = graphene.Int()
+    children = graphene.List(lambda: StoryCommentObject, description='Replies loaded by the comment thread query')
 
     def resolve_votes(self, info):
-        return self.get_votes()
+        return self.votes_count
     
     def resolve_my_vote(self, info):
         if info.context.user.is_authenticated:
-            return self.user_vote(info.context.user)
+            return get_loader(info, StoryCommentMyVoteLoader).load(self.pk)
         else: return None
 
+    def resolve_children(self, info):
+        return getattr(self, 'thread_children', None)
+
     def resolve_reply_count(self, info):
-        return self.replies.count()
+        return self.reply_count
 
     @classmethod
     def get_queryset(cls, queryset, info, **kwargs):
@@ -119,26 +131,21 @@ class PostObject(DjangoObjectType):
         }
         fields = '__all__'
         use_connection = True
+        connection_class = CountableConnection
 
     comments_count = graphene.Int()
     claps_count = graphene.Int()
     clapped_by_me = graphene.Boolean()
     saved_by_me = graphene.Boolean()
 
-    def resolve_comments_count(self, info):
-        return self.comments.filter(parent=None).count()
-    
-    def resolve_claps_count(self, info):
-        return self.claps.count()
-    
     def resolve_clapped_by_me(self, info):
         if info.context.user.is_authenticated:
-            return self.claps.filter(user=info.context.user).exists()
+            return get_loader(info, PostClappedByMeLoader).load(self.key)
         else: return False
 
     def resolve_saved_by_me(self, info):
         if info.context.user.is_authenticated:
-            return info.context.user.saved_posts.filter(key=self.key).exists()
+            return get_loader(info, PostSavedByMeLoader).load(self.key)
         else: return False
 
 class PostClapObject(DjangoObjectType):
@@ -168,26 +175,22 @@ class PostPollObject(DjangoObjectType):
 
     def resolve_options(self, info):
         if info.context.user.is_authenticated:
-            votes, count = self.get_votes()
-            options = []
-            for option in self.options:
-                options.append({
-                    'id': option.get('id'),
-                    'text': option.get('text'),
-                    'votes': votes.filter(option=option.get('id')).count()
-                })
-            return options
+            tally, my_vote = get_loader(info, PollTallyLoader).load(self.pk)
+            return [{
+                'id': option.get('id'),
+                'text': option.get('text'),
+                'votes': tally.get(option.get('id'), 0),
+            } for option in self.options]
         else: return self.options
 
     def resolve_my_vote(self, info):
         if info.context.user.is_authenticated:
-            id = self.user_vote(info.context.user)
-            return id
+            tally, my_vote = get_loader(info, PollTallyLoader).load(self.pk)
+            return my_vote
         return None
     
     def resolve_votes_count(self, info):
-        votes, count = self.get_votes()
-        return count
+        return self.votes_count
 
 
 class PostImageObject(DjangoObjectType):
@@ -208,21 +211,26 @@ class PostCommentObject(DjangoObjectType):
         filterset_class = PostCommentFilter
         fields = '__all__'
         use_connection = True
+        connection_class = CountableConnection
 
     votes = graphene.Int()
     my_vote = graphene.String()
     reply_count = graphene.Int()
+    children = graphene.List(lambda: PostCommentObject, description='Replies loaded by the comment thread query')
 
     def resolve_votes(self, info):
-        return self.get_votes()
+        return self.votes_count
     
     def resolve_my_vote(self, info):
         if info.context.user.is_authenticated:
-            return self.user_vote(info.context.user)
+            return get_loader(info, PostCommentMyVoteLoader).load(self.pk)
         else: return None
 
+    def resolve_children(self, info):
+        return getattr(self, 'thread_children', None)
+
     def resolve_reply_count(self, info):
-        return self.replies.count()
+        return self.reply_count
 
     @classmethod
     def get_queryset(cls, queryset, info, **kwargs):
@@ -231,6 +239,17 @@ class PostCommentObject(DjangoObjectType):
             return queryset.filter(parent__id=p_Id)
         return queryset.filter(parent__id=None)
     
+class TimelineEntryObject(DjangoObjectType):
+    class Meta:
+        model = TimelineEntry
+        interfaces = (relay.Node, )
+        filter_fields = {
+            'author__key': ['exact'],
+        }
+        fields = ('id', 'author', 'story', 'post', 'published_at')
+        use_connection = True
+        connection_class = CountableConnection
+
 
 '''****************** MUTATIONS TYPES ******************'''
 
@@ -252,45 +271,43 @@ class CreateStory(graphene.Mutation):
         return CreateStory(story=story)
 
 class StoryClapAction(graphene.Mutation):
-    '''Clap on a Story'''
+    '''Clap on a Story, or take the clap back'''
     class Input():
         story_key = graphene.String(required=True)
 
     story = graphene.Field(StoryObject)
+    clapped = graphene.Boolean()
+    claps_count = graphene.Int()
     
     def mutate(self, info, story_key):
         user = info.context.user if info.context.user.is_authenticated else None
         if not user: raise Exception('You are not authorized to clap on a Story.')
         story = Story.objects.get(key=story_key)
         if not story: raise Exception('Story not found.')
-        clap = StoryClap.objects.filter(user=user, story=story)
-        if clap.exists():
-            clap.delete()
-            story.refresh_from_db()
-            return StoryClapAction(story=story)
-        clap = StoryClap(user=user, story=story)
-        clap.save()
-        story.refresh_from_db()
-        return StoryClapAction(story=story)
+        with transaction.atomic():
+            delta = toggle(StoryClap, user=user, story=story)
+            increment(Story, story.pk, claps_count=delta)
+            if delta > 0: trending.record(Story, story.pk, 'clap')
+        story.claps_count = max(story.claps_count + delta, 0)
+        if delta: story_activity(story.pk, claps_delta=delta, claps_count=story.claps_count)
+        return StoryClapAction(story=story, clapped=delta >= 0, claps_count=story.claps_count)
     
 class saveStoryAction(graphene.Mutation):
-    '''Save a Story'''
+    '''Save a Story, or remove it from the saved Stories'''
     class Input():
         story_key = graphene.String(required=True)
 
     story = graphene.Field(StoryObject)
     success = graphene.Boolean(default_value=False)
+    saved = graphene.Boolean()
     
     def mutate(self, info, story_key):
         user = info.context.user if info.context.user.is_authenticated else None
         if not user: raise Exception('You are not authorized to save a Story.')
         story = Story.objects.get(key=story_key)
         if not story: raise Exception('Story not found.')
-        if user.saved_stories.filter(key=story_key).exists():
-            user.saved_stories.remove(story)
-            return saveStoryAction(story=story, success=True)
-        user.saved_stories.add(story)
-        return saveStoryAction(story=story, success=True)
+        delta = toggle(User.saved_stories.through, user=user, story=story)
+        return saveStoryAction(story=story, success=True, saved=delta >= 0)
     
 class UpdateStory(graphene.Mutation):
     '''Update an existing Story'''
@@ -324,6 +341,7 @@ class UpdateStory(graphene.Mutation):
             category = Category.objects.get(name=data.get('category'))
             story.category = category
         story.save()
+        if data.get('do_publish', False): timeline.fan_out(story)
         return UpdateStory(story=story)
     
 class CreateStoryComment(graphene.Mutation):
@@ -353,7 +371,12 @@ class CreateStoryComment(graphene.Mutation):
             author=author,
             parent=parent,
         )
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            if parent: increment(StoryComment, parent.pk, reply_count=1)
+            else: increment(Story, story.pk, comments_count=1)
+            trending.record(Story, story.pk, 'comment')
+            story_activity(story.pk, comments_delta=0 if parent else 1, comment_ids=[comment.id])
         return CreateStoryComment(comment=comment)
     
 class UpdateStoryComment(graphene.Mutation):    
@@ -376,24 +399,24 @@ class UpdateStoryComment(graphene.Mutation):
         return UpdateStoryComment(comment=comment)
     
 class StoryCommentVoteAction(graphene.Mutation):
-    '''Vote on a Comment'''
+    '''Vote on a Comment, or take the vote back'''
     class Input():
         comment_id = graphene.String(required=True)
 
     comment = graphene.Field(StoryCommentObject)
+    voted = graphene.Boolean()
+    votes_count = graphene.Int()
     
     def mutate(self, info, comment_id):
         user = info.context.user if info.context.user.is_authenticated else None
         if not user: raise Exception('You are not authorized to vote on a Comment.')
         comment = StoryComment.objects.get(id=comment_id)
         if not comment: raise Exception('Comment not found.')
-        vote = StoryCommentVote.objects.filter(user=user, comment=comment)
-        if vote.exists():
-            vote.delete()
-        else:
-            vote = StoryCommentVote(user=user, comment=comment)
-            vote.save()
-        return StoryCommentVoteAction(comment=comment)
+        with transaction.atomic():
+            delta = toggle(StoryCommentVote, user=user, comment=comment)
+            increment(StoryComment, comment.pk, votes_count=delta)
+        comment.votes_count = max(comment.votes_count + delta, 0)
+        return StoryCommentVoteAction(comment=comment, voted=delta >= 0, votes_count=comment.votes_count)
     
 class CreatePost(graphene.Mutation):
     '''Create a new Post'''
@@ -432,6 +455,7 @@ class CreatePost(graphene.Mutation):
                 if not image: raise Exception('Image not found.')
                 post.type_image = image
         post.save()
+        timeline.fan_out(post)
         return CreatePost(post=post)
     
 class UpdatePost(graphene.Mutation):
@@ -451,45 +475,43 @@ class UpdatePost(graphene.Mutation):
         return UpdatePost(post=post)
     
 class savePostAction(graphene.Mutation):
-    '''Save a Post'''
+    '''Save a Post, or remove it from the saved Posts'''
     class Input():
         post_key = graphene.String(required=True)
 
     post = graphene.Field(PostObject)
     success = graphene.Boolean(default_value=False)
+    saved = graphene.Boolean()
     
     def mutate(self, info, post_key):
         user = info.context.user if info.context.user.is_authenticated else None
         if not user: raise Exception('You are not authorized to save a Post.')
         post = Post.objects.get(key=post_key)
         if not post: raise Exception('Post not found.')
-        if user.saved_posts.filter(key=post_key).exists():
-            user.saved_posts.remove(post)
-            return savePostAction(post=post, success=True)
-        user.saved_posts.add(post)
-        return savePostAction(post=post, success=True)
+        delta = toggle(User.saved_posts.through, user=user, post=post)
+        return savePostAction(post=post, success=True, saved=delta >= 0)
     
 class PostClapAction(graphene.Mutation):
-    '''Clap on a Post'''
+    '''Clap on a Post, or take the clap back'''
     class Input():
         post_key = graphene.String(required=True)
 
     post = graphene.Field(PostObject)
+    clapped = graphene.Boolean()
+    claps_count = graphene.Int()
     
     def mutate(self, info, post_key):
         user = info.context.user if info.context.user.is_authenticated else None
         if not user: raise Exception('You are not authorized to clap on a Post.')
         post = Post.objects.get(key=post_key)
         if not post: raise Exception('Post not found.')
-        clap = PostClap.objects.filter(user=user, post=post)
-        if clap.exists():
-            clap.delete()
-            post.refresh_from_db()
-            return PostClapAction(post=post)
-        clap = PostClap(user=user, post=post)
-        clap.save()
-        post.refresh_from_db()
-        return PostClapAction(post=post)
+        with transaction.atomic():
+            delta = toggle(PostClap, user=user, post=post)
+            increment(Post, post.pk, claps_count=delta)
+            if delta > 0: trending.record(Post, post.pk, 'clap')
+        post.claps_count = max(post.claps_count + delta, 0)
+        if delta: post_activity(post.pk, claps_delta=delta, claps_count=post.claps_count)
+        return PostClapAction(post=post, clapped=delta >= 0, claps_count=post.claps_count)
     
 class CreatePostPoll(graphene.Mutation):
     '''Create a new Poll Post'''
@@ -534,14 +556,23 @@ class VotePostPoll(graphene.Mutation):
         option = poll.option_by_id(option_id)
         if not option:
             raise Exception('Option not found.')
-        userVotes = PostPollVote.objects.filter(user=user, poll=poll)
-        is_current_vote = userVotes.filter(option=option_id)
-        if is_current_vote.exists():
-            is_current_vote.delete()
-        else:
-            userVotes.delete()
-            vote = PostPollVote(user=user, poll=poll, option=option.get('id'))
-            vote.save()
+        with transaction.atomic():
+            userVotes = PostPollVote.objects.filter(user=user, poll=poll)
+            is_current_vote = userVotes.filter(option=option_id)
+            previous = list(userVotes.values_list('option', flat=True))
+            if option_id in previous:
+                removed, _ = is_current_vote.delete()
+                increment(PostPoll, poll.pk, votes_count=-removed)
+                option_deltas = {str(option_id): -removed}
+            else:
+                removed, _ = userVotes.delete()
+                option_deltas = {str(previous_option): -previous.count(previous_option) for previous_option in previous}
+                vote = PostPollVote(user=user, poll=poll, option=option.get('id'))
+                vote.save()
+                increment(PostPoll, poll.pk, votes_count=1 - removed)
+                option_deltas[str(option.get('id'))] = 1
+        poll.refresh_from_db(fields=['votes_count'])
+        poll_tally(post.pk, votes_delta=sum(option_deltas.values()), votes_count=poll.votes_count, option_deltas=option_deltas)
         return VotePostPoll(poll=poll)
     
 class CreatePostImage(graphene.Mutation):
@@ -592,7 +623,12 @@ class CreatePostComment(graphene.Mutation):
             author=author,
             parent=parent,
         )
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            if parent: increment(PostComment, parent.pk, reply_count=1)
+            else: increment(Post, post.pk, comments_count=1)
+            trending.record(Post, post.pk, 'comment')
+            post_activity(post.pk, comments_delta=0 if parent else 1, comment_ids=[comment.id])
         return CreatePostComment(comment=comment)
     
 class UpdatePostComment(graphene.Mutation):
@@ -615,42 +651,59 @@ class UpdatePostComment(graphene.Mutation):
         return UpdatePostComment(comment=comment)
 
 class PostCommentVoteAction(graphene.Mutation):
-    '''Vote on a Comment'''
+    '''Vote on a Comment, or take the vote back'''
     class Input():
         comment_id = graphene.String(required=True)
 
     comment = graphene.Field(PostCommentObject)
+    voted = graphene.Boolean()
+    votes_count = graphene.Int()
     
     def mutate(self, info, comment_id):
         user = info.context.user if info.context.user.is_authenticated else None
         if not user: raise Exception('You are not authorized to vote on a Comment.')
         comment = PostComment.objects.get(id=comment_id)
         if not comment: raise Exception('Comment not found.')
-        vote = PostCommentVote.objects.filter(user=user, comment=comment)
-        if vote.exists():
-            vote.delete()
-        else:
-            vote = PostCommentVote(user=user, comment=comment)
-            vote.save()
-        return PostCommentVoteAction(comment=comment)
+        with transaction.atomic():
+            delta = toggle(PostCommentVote, user=user, comment=comment)
+            increment(PostComment, comment.pk, votes_count=delta)
+        comment.votes_count = max(comment.votes_count + delta, 0)
+        return PostCommentVoteAction(comment=comment, voted=delta >= 0, votes_count=comment.votes_count)
 
 
 '''****************** QUERIES ******************'''
 
 class Query(graphene.ObjectType):
-    Stories = DjangoFilterConnectionField(StoryObject)
-    Story = graphene.relay.node.Field(StoryObject)
-    Posts = DjangoFilterConnectionField(PostObject)
-    Post = graphene.relay.node.Field(PostObject)
-    StoryComments = DjangoFilterConnectionField(StoryCommentObject)
-    PostComments = DjangoFilterConnectionField(PostCommentObject)
+    Stories = KeysetConnectionField(StoryObject, ordering=('-published_at', '-key'))
+    Story = graphene.Field(StoryObject, key=graphene.String(required=True))
+    Posts = KeysetConnectionField(PostObject, ordering=('-published_at', '-key'))
+    Post = graphene.Field(PostObject, key=graphene.String(required=True))
+    StoryComments = KeysetConnectionField(StoryCommentObject, ordering=('-created_at', '-id'))
+    PostComments = KeysetConnectionField(PostCommentObject, ordering=('-created_at', '-id'))
 
     '''***** User Content *****'''
-    MySavedStories = DjangoFilterConnectionField(StoryObject)
+    MySavedStories = ConnectionField(StoryObject)
+    HomeFeed = KeysetConnectionField(TimelineEntryObject, ordering=('-published_at', '-id'))
+    StoryCommentThread = graphene.List(
+        StoryCommentObject, story_key=graphene.String(required=True), parent_id=graphene.String(),
+        depth=graphene.Int(default_value=3), width=graphene.Int(default_value=10),
+    )
+    PostCommentThread = graphene.List(
+        PostCommentObject, post_key=graphene.String(required=True), parent_id=graphene.String(),
+        depth=graphene.Int(default_value=3), width=graphene.Int(default_value=10),
+    )
+    TrendingStories = KeysetConnectionField(StoryObject, ordering=('-trending_score', '-key'))
+    TrendingPosts = KeysetConnectionField(PostObject, ordering=('-trending_score', '-key'))
 
     '''***** Non Usefull Queries *****'''
-    Polls = DjangoFilterConnectionField(PostPollObject)
-    PostImages = DjangoFilterConnectionField(PostImageObject)
+    Polls = ConnectionField(PostPollObject)
+    PostImages = ConnectionField(PostImageObject)
+
+    def resolve_Story(self, info, key):
+        return objectcache.get(Story, pk=key)
+
+    def resolve_Post(self, info, key):
+        return objectcache.get(Post, pk=key)
 
     def resolve_MySavedStories(self, info):
         user = info.context.user
@@ -658,6 +711,31 @@ class Query(graphene.ObjectType):
             return user.saved_stories.all()
         return None
 
+    def resolve_StoryCommentThread(self, info, story_key, parent_id=None, depth=3, width=10):
+        comments = StoryComment.objects.filter(story_id=story_key)
+        parent = comments.get(id=parent_id) if parent_id else None
+        return load_thread(info, comments, parent, depth, width)
+
+    def resolve_PostCommentThread(self, info, post_key, parent_id=None, depth=3, width=10):
+        comments = PostComment.objects.filter(post_id=post_key)
+        parent = comments.get(id=parent_id) if parent_id else None
+        return load_thread(info, comments, parent, depth, width)
+
+    def resolve_TrendingStories(self, info, **kwargs):
+        return trending.trending(Story.objects.all())
+
+    def resolve_TrendingPosts(self, info, **kwargs):
+        return trending.trending(Post.objects.all())
+
+    def resolve_HomeFeed(self, info, **kwargs):
+        user = info.context.user
+        if not user.is_authenticated:
+            return TimelineEntry.objects.none()
+        if not kwargs.get('after') and not kwargs.get('before'):
+            timeline.pull(user)
+        # Entries stay behind when their item is unpublished, made private or deleted.
+        return timeline.visible_entries(TimelineEntry.objects.filter(user=user))
+
 '''****************** MUTATIONS ******************'''
 
 class Mutation(graphene.ObjectType):
@@ -0,0 +1,106 @@
+import channels_graphql_ws
+import graphene
+
+from Api import broadcast
+
+
+class StoryActivity(channels_graphql_ws.Subscription):
+    """Claps and comments on a Story, coalesced into deltas."""
+
+    # Activity is sent as deltas over short windows, so a subscriber that
+    # falls this far behind has lost track anyway.
+    notification_queue_limit = 64
+
+    story_key = graphene.String()
+    claps_delta = graphene.Int()
+    claps_count = graphene.Int()
+    comments_delta = graphene.Int()
+    comment_ids = graphene.List(graphene.String)
+
+    class Arguments:
+        story_key = graphene.String(required=True)
+
+    @staticmethod
+    async def subscribe(root, info, story_key):
+        return [f'story.{story_key}']
+
+    @staticmethod
+    async def publish(payload, info, story_key):
+        return StoryActivity(story_key=story_key, **payload)
+
+
+class PostActivity(channels_graphql_ws.Subscription):
+    """Claps and comments on a Post, coalesced into deltas."""
+
+    notification_queue_limit = 64
+
+    post_key = graphene.String()
+    claps_delta = graphene.Int()
+    claps_count = graphene.Int()
+    comments_delta = graphene.Int()
+    comment_ids = graphene.List(graphene.String)
+
+    class Arguments:
+        post_key = graphene.String(required=True)
+
+    @staticmethod
+    async def subscribe(root, info, post_key):
+        return [f'post.{post_key}']
+
+    @staticmethod
+    async def publish(payload, info, post_key):
+        return PostActivity(post_key=post_key, **payload)
+
+
+class PollOptionDelta(graphene.ObjectType):
+    id = graphene.Int()
+    votes_delta = graphene.Int()
+
+
+class PollTally(channels_graphql_ws.Subscription):
+    """Vote changes of the poll of a Post, coalesced into deltas."""
+
+    notification_queue_limit = 64
+
+    post_key = graphene.String()
+    votes_delta = graphene.Int()
+    votes_count = graphene.Int()
+    options = graphene.List(PollOptionDelta)
+
+    class Arguments:
+        post_key = graphene.String(required=True)
+
+    @staticmethod
+    async def subscribe(root, info, post_key):
+        return [f'poll.{post_key}']
+
+    @staticmethod
+    async def publish(payload, info, post_key):
+        options = [
+            PollOptionDelta(id=int(option), votes_delta=delta)
+            for option, delta in payload.get('option_deltas', {}).items() if delta
+        ]
+        return PollTally(
+            post_key=post_key,
+            votes_delta=payload.get('votes_delta', 0),
+            votes_count=payload.get('votes_count'),
+            options=options,
+        )
+
+
+def story_activity(story_key, **payload):
+    broadcast.publish(StoryActivity, f'story.{story_key}', payload)
+
+
+def post_activity(post_key, **payload):
+    broadcast.publish(PostActivity, f'post.{post_key}', payload)
+
+
+def poll_tally(post_key, **payload):
+    broadcast.publish(PollTally, f'poll.{post_key}', payload)
+
+
+class Subscription(graphene.ObjectType):
+    story_activity = StoryActivity.Field()
+    post_activity = PostActivity.Field()
+    poll_tally = PollTally.Field()
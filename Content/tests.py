@@ -1,3 +1,101 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from Api.schema import schema
+from Common.models import Category, Image, Tag
+from Content.models import Post, PostComment, Story, StoryComment
+from Creator.models import Creator
+from User.models import User
+
+STORIES = '''
+query($first: Int) {
+  Stories(first: $first) {
+    edges { node { title author { name user { image { url } } } category { name } tags { name } } }
+  }
+}
+'''
+
+POSTS = '''
+query($first: Int) {
+  Posts(first: $first) {
+    edges { node { text author { name user { image { url } } } tags { name } } }
+  }
+}
+'''
+
+STORY_COMMENTS = '''
+query($first: Int) {
+  StoryComments(first: $first) {
+    edges { node { content author { name user { image { url } } } story { title category { name } tags { name } } } }
+  }
+}
+'''
+
+POST_COMMENTS = '''
+query($first: Int) {
+  PostComments(first: $first) {
+    edges { node { content author { name user { image { url } } } post { text tags { name } } } }
+  }
+}
+'''
+
+
+class ListingQueriesTest(TestCase):
+    """Listings run the same number of queries whatever the size of the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category(name='Python')
+        category.save()
+        tags = [Tag(name=f'tag {index}') for index in range(3)]
+        for tag in tags:
+            tag.save()
+        for index in range(12):
+            image = Image(url=f'https://example.com/{index}.png')
+            image.save()
+            user = User.objects.create_user(email=f'user{index}@example.com', username=f'user{index}', password='password')
+            user.image = image
+            user.save()
+            creator = Creator(name=f'Creator {index}', handle=f'creator{index}', user=user)
+            creator.save()
+            story = Story(
+                author=creator, category=category, slug=f'story-{index}', title=f'Story {index}',
+                state='published', published_at=timezone.now(),
+            )
+            story.save()
+            story.tags.set(tags)
+            post = Post(author=creator, text=f'Post {index}', published_at=timezone.now())
+            post.save()
+            post.tags.set(tags)
+            StoryComment(story=story, user=user, author=creator, content='A comment').save()
+            PostComment(post=post, user=user, author=creator, content='A comment').save()
+
+    def execute(self, query, first):
+        request = RequestFactory().post('/api/')
+        request.user = AnonymousUser()
+        result = schema.execute(query, variables={'first': first}, context_value=request)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def assertQueriesIndependentOfPageSize(self, query, field, queries):
+        for first in (2, 10):
+            with self.subTest(first=first), self.assertNumQueries(queries):
+                data = self.execute(query, first)
+            self.assertEqual(len(data[field]['edges']), first)
+        return [edge['node'] for edge in data[field]['edges']]
+
+    def test_stories(self):
+        stories = self.assertQueriesIndependentOfPageSize(STORIES, 'Stories', 2)
+        self.assertEqual(stories[0]['category'], {'name': 'Python'})
+        self.assertEqual(len(stories[0]['tags']), 3)
+        self.assertTrue(stories[0]['author']['user']['image']['url'].startswith('https://example.com/'))
+
+    def test_posts(self):
+        self.assertQueriesIndependentOfPageSize(POSTS, 'Posts', 2)
+
+    def test_story_comments(self):
+        self.assertQueriesIndependentOfPageSize(STORY_COMMENTS, 'StoryComments', 2)
+
+    def test_post_comments(self):
+        self.assertQueriesIndependentOfPageSize(POST_COMMENTS, 'PostComments', 2)
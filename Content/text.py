@@ -0,0 +1,54 @@
+import json
+import math
+import re
+
+from django.utils.html import strip_tags
+
+# Length of Story.excerpt, and the reading speed Story.reading_time assumes.
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+
+WORD = re.compile(r'\w+', re.UNICODE)
+SPACE = re.compile(r'\s+')
+
+
+def plain_text(value):
+    '''Text of a Story body, which is either HTML or editor JSON blocks'''
+    if not value:
+        return ''
+    try:
+        data = json.loads(value)
+    except ValueError:
+        return strip_tags(value)
+    strings = []
+
+    def collect(node):
+        if isinstance(node, str):
+            strings.append(strip_tags(node))
+        elif isinstance(node, dict):
+            for key, child in node.items():
+                if key not in ('id', 'type', 'url', 'file', 'style'):
+                    collect(child)
+        elif isinstance(node, list):
+            for child in node:
+                collect(child)
+
+    collect(data)
+    return ' '.join(strings)
+
+
+def excerpt(text, length=EXCERPT_LENGTH):
+    '''`text` with collapsed whitespace, cut at the last word boundary before `length` characters'''
+    text = SPACE.sub(' ', text or '').strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip(' .,;:') + '…'
+
+
+def reading_time(text):
+    '''Minutes it takes to read `text`, at least 1 when it has any words'''
+    words = len(WORD.findall(text or ''))
+    return math.ceil(words / WORDS_PER_MINUTE) if words else 0
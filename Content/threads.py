@@ -0,0 +1,49 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from graphql import get_named_type
+
+from Api.loaders import get_loaders
+from Api.optimizer import QueryOptimizer
+
+MAX_DEPTH = 10
+MAX_WIDTH = 50
+
+
+def load_thread(info, queryset, parent=None, depth=3, width=10):
+    '''Comments of `queryset` below `parent` (or from the top level) down to
+    `depth` levels, keeping the first `width` replies of every comment.
+
+    The subtree is read with one range scan over the comment paths, which
+    keeps the first `width` replies of every parent. Replies whose ancestors
+    were cut are dropped while the tree is built, and each returned comment
+    has its replies in `thread_children`.'''
+    if not 0 < depth <= MAX_DEPTH: raise Exception(f'depth must be between 1 and {MAX_DEPTH}.')
+    if not 0 < width <= MAX_WIDTH: raise Exception(f'width must be between 1 and {MAX_WIDTH}.')
+
+    top = parent.depth + 1 if parent else 0
+    if parent:
+        queryset = queryset.filter(path__startswith=parent.path, depth__gt=parent.depth)
+    scan = queryset.filter(depth__lt=top + depth).annotate(rank=Window(
+        RowNumber(), partition_by=[F('parent_id')], order_by=[F('created_at').asc(), F('id').asc()],
+    )).filter(rank__lte=width)
+
+    # Replies select the same fields as their parents, so plan the joins
+    # once, and keep every column since nested selections may differ.
+    plan = QueryOptimizer(info).plan(get_named_type(info.return_type), info.field_nodes)
+    plan.deferred = []
+
+    children = {}
+    for comment in sorted(plan.apply(scan), key=lambda comment: comment.rank):
+        children.setdefault(comment.parent_id, []).append(comment)
+
+    # Walk down from the roots, so only replies of kept comments are returned.
+    roots = children.get(parent.pk if parent else None, [])
+    loaded, stack = [], list(roots)
+    while stack:
+        comment = stack.pop()
+        comment.thread_children = children.get(comment.pk, [])
+        loaded.append(comment.pk)
+        stack.extend(comment.thread_children)
+    if loaded:
+        get_loaders(info).queue(queryset.model, loaded)
+    return roots
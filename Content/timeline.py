@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from nanoid import generate
+
+from Content.models import Story, Post, TimelineEntry
+from Creator.models import CreatorFollower
+
+# Creators with more followers than this are not fanned out on write; their
+# followers pull new content into their timeline when they read it.
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+# Timeline entries are kept this long, and at most this many per user.
+MAX_AGE = timedelta(days=getattr(settings, 'TIMELINE_MAX_AGE_DAYS', 90))
+MAX_ENTRIES = getattr(settings, 'TIMELINE_MAX_ENTRIES', 1000)
+BATCH_SIZE = 1000
+LARGE_CREATORS_KEY = 'timeline:large-creators'
+LARGE_CREATORS_TIMEOUT = 600
+
+
+def large_creators():
+    '''Keys of the creators that are fanned out on read'''
+    keys = cache.get(LARGE_CREATORS_KEY)
+    if keys is None:
+        keys = set(
+            CreatorFollower.objects.values('creator').annotate(followers=Count('pk'))
+            .filter(followers__gt=FANOUT_LIMIT).values_list('creator', flat=True).order_by()
+        )
+        cache.set(LARGE_CREATORS_KEY, keys, LARGE_CREATORS_TIMEOUT)
+    return keys
+
+
+def entries_for(users, item):
+    target = {'story': item} if isinstance(item, Story) else {'post': item}
+    return [
+        TimelineEntry(id=generate(size=40), user_id=user, author_id=item.author_id, published_at=item.published_at, **target)
+        for user in users
+    ]
+
+
+def is_visible(item):
+    return item.state == 'published' and item.privacy == 'public' and not item.is_deleted and item.published_at
+
+
+def visible_entries(entries):
+    '''`entries` whose Story or Post is still published, public and not deleted'''
+    return entries.filter(
+        Q(story__state='published', story__privacy='public', story__is_deleted=False)
+        | Q(post__state='published', post__privacy='public', post__is_deleted=False)
+    )
+
+
+def fan_out(item):
+    '''Write a published Story or Post into the timeline of every follower of its author'''
+    if not is_visible(item) or item.author_id in large_creators():
+        return 0
+    followers = CreatorFollower.objects.filter(creator_id=item.author_id).values_list('user_id', flat=True)
+    written, batch = 0, []
+    for user in followers.iterator(chunk_size=BATCH_SIZE):
+        batch.append(user)
+        if len(batch) == BATCH_SIZE:
+            written += len(TimelineEntry.objects.bulk_create(entries_for(batch, item), ignore_conflicts=True))
+            batch = []
+    if batch:
+        written += len(TimelineEntry.objects.bulk_create(entries_for(batch, item), ignore_conflicts=True))
+    return written
+
+
+def published_by(authors, since):
+    for model in (Story, Post):
+        yield from model.objects.filter(
+            author_id__in=authors, state='published', privacy='public', is_deleted=False, published_at__gt=since,
+        ).only('pk', 'author_id', 'published_at', 'state', 'privacy', 'is_deleted').order_by('-published_at')[:MAX_ENTRIES]
+
+
+def backfill(user, authors, since=None):
+    '''Copy the recent content of `authors` into the timeline of `user`'''
+    since = since or timezone.now() - MAX_AGE
+    entries = [entry for item in published_by(authors, since) for entry in entries_for([user.pk], item)]
+    return len(TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True, batch_size=BATCH_SIZE))
+
+
+def pull(user):
+    '''Fan-out-on-read for the large creators `user` follows'''
+    large = large_creators()
+    if not large:
+        return 0
+    authors = list(CreatorFollower.objects.filter(user=user, creator_id__in=large).values_list('creator_id', flat=True))
+    if not authors:
+        return 0
+    since = TimelineEntry.objects.filter(user=user, author_id__in=authors).aggregate(since=Max('published_at'))['since']
+    return backfill(user, authors, since)
+
+
+def remove(user, author):
+    '''Drop the entries of `author` from the timeline of `user`, after an unfollow'''
+    return TimelineEntry.objects.filter(user=user, author=author).delete()[0]
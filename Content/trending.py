@@ -0,0 +1,135 @@
+'''Time-decayed engagement scores for Stories and Posts.
+
+An event of weight `w` at time `t` is worth `w * exp(-(now - t) / TAU)`
+now. Every item decays by the same factor, so instead of decaying every
+stored score over time each event is stored as `w * exp((t - epoch) / TAU)`
+and newer events simply weigh more. Adding an event is then a single
+`score = score + x` update, and ordering by the stored score is ordering by
+the decayed score. `rebase()` moves the epoch forward now and then so the
+stored values stay within float range, and `rerank()` recomputes the scores
+from the recent events to drop removed claps and comments.
+
+The epoch lives in the database and is moved in the transaction scaling the
+scores. `record()` checks it after its update, while it holds the row lock
+a rebase would wait for, and `rerank()` locks the rows it rewrites, so
+neither races with a rebase or with each other.
+'''
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from Content.models import Story, StoryClap, StoryComment, Post, PostClap, PostComment, TrendingEpoch
+
+TRENDING = getattr(settings, 'TRENDING', {})
+HALF_LIFE = timedelta(hours=TRENDING.get('HALF_LIFE_HOURS', 24))
+TAU = HALF_LIFE.total_seconds() / math.log(2)
+WINDOW = timedelta(days=TRENDING.get('WINDOW_DAYS', 7))
+WEIGHTS = {'clap': 1.0, 'comment': 3.0, **TRENDING.get('WEIGHTS', {})}
+# Stored scores grow by e for every TAU after the epoch, rebase well before
+# they get near the float limit.
+REBASE_AFTER = timedelta(days=TRENDING.get('REBASE_AFTER_DAYS', 7))
+BATCH_SIZE = 1000
+
+# item model -> (event model, item foreign key, event kind)
+EVENTS = {
+    Story: ((StoryClap, 'story_id', 'clap'), (StoryComment, 'story_id', 'comment')),
+    Post: ((PostClap, 'post_id', 'clap'), (PostComment, 'post_id', 'comment')),
+}
+
+# The epoch last read by this process, what record() expects it to be.
+_epoch = None
+
+
+def get_epoch():
+    '''The current epoch, read from the database'''
+    global _epoch
+    row = TrendingEpoch.objects.first() or TrendingEpoch.objects.create(epoch=timezone.now())
+    _epoch = row.epoch
+    return _epoch
+
+
+def weight_at(kind, when, epoch):
+    '''Stored value of one event of `kind` that happened at `when`'''
+    return WEIGHTS[kind] * math.exp((when - epoch).total_seconds() / TAU)
+
+
+def decayed(score, epoch, now=None):
+    '''Value of a stored score at `now`'''
+    return score * math.exp(((epoch - (now or timezone.now())).total_seconds()) / TAU)
+
+
+def record(model, pk, kind, when=None):
+    '''Add one engagement event to the score of an item'''
+    when = when or timezone.now()
+    epoch = _epoch or get_epoch()
+    value = weight_at(kind, when, epoch)
+    with transaction.atomic():
+        model.objects.filter(pk=pk).update(trending_score=F('trending_score') + value)
+        # A rebase committed since `epoch` was read has not scaled `value`:
+        # it would otherwise be waiting for the row this update locked.
+        current = get_epoch()
+        if current != epoch:
+            model.objects.filter(pk=pk).update(
+                trending_score=F('trending_score') + (weight_at(kind, when, current) - value)
+            )
+
+
+def trending(queryset):
+    return queryset.filter(state='published', privacy='public', is_deleted=False, trending_score__gt=0)
+
+
+def rebase(now=None):
+    '''Move the epoch to `now` and scale every stored score to match'''
+    global _epoch
+    now = now or timezone.now()
+    with transaction.atomic():
+        row = TrendingEpoch.objects.select_for_update().first()
+        if row is None:
+            TrendingEpoch.objects.create(epoch=now)
+            return now
+        factor = math.exp((row.epoch - now).total_seconds() / TAU)
+        for model in EVENTS:
+            model.objects.filter(trending_score__gt=0).update(trending_score=F('trending_score') * factor)
+        row.epoch = now
+        row.save()
+    _epoch = now
+    return now
+
+
+def rerank(model, now=None, batch_size=BATCH_SIZE):
+    '''Recompute the scores of `model` from the events of the last WINDOW'''
+    since = (now or timezone.now()) - WINDOW
+    keys = set(model.objects.filter(trending_score__gt=0).values_list('pk', flat=True).order_by())
+    for event_model, fk, kind in EVENTS[model]:
+        keys.update(event_model.objects.filter(created_at__gte=since).values_list(fk, flat=True).distinct().order_by())
+    keys = sorted(keys)
+    return sum(rerank_batch(model, keys[start:start + batch_size], since) for start in range(0, len(keys), batch_size))
+
+
+def rerank_batch(model, keys, since):
+    '''Recompute the scores of the items of `model` with `keys`, returns how many changed'''
+    with transaction.atomic():
+        # Locked until the new scores are written: record() waits instead of
+        # being overwritten, and a rebase scales the new scores.
+        scores = dict(
+            model.objects.select_for_update().filter(pk__in=keys).order_by('pk').values_list('pk', 'trending_score')
+        )
+        epoch = get_epoch()
+        expected = dict.fromkeys(scores, 0.0)
+        for event_model, fk, kind in EVENTS[model]:
+            events = event_model.objects.filter(**{f'{fk}__in': keys}, created_at__gte=since).values_list(fk, 'created_at')
+            for key, created_at in events:
+                if key in expected:
+                    expected[key] += weight_at(kind, created_at, epoch)
+
+        pk_name = model._meta.pk.attname
+        changed = [
+            model(**{pk_name: key, 'trending_score': F('trending_score') + (expected[key] - score)})
+            for key, score in scores.items() if not math.isclose(score, expected[key], rel_tol=1e-9)
+        ]
+        model.objects.bulk_update(changed, ['trending_score'])
+    return len(changed)
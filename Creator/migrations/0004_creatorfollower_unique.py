@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_followers(apps, schema_editor):
+    CreatorFollower = apps.get_model('Creator', 'CreatorFollower')
+    duplicates = (
+        CreatorFollower.objects.values('creator', 'user').annotate(keep=Min('pk'), count=Count('pk')).filter(count__gt=1).order_by()
+    )
+    for row in duplicates.iterator():
+        CreatorFollower.objects.filter(creator=row['creator'], user=row['user']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Creator', '0003_creatorfollower_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_followers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='creatorfollower',
+            constraint=models.UniqueConstraint(fields=('creator', 'user'), name='creator_followers_uniq'),
+        ),
+    ]
@@ -55,6 +55,9 @@ class CreatorFollower(models.Model):
         db_table = 'creator_followers'
         verbose_name = 'creator follower'
         verbose_name_plural = 'creator followers'
+        constraints = [
+            models.UniqueConstraint(fields=['creator', 'user'], name='creator_followers_uniq'),
+        ]
     
     def __str__(self):
         return f'{self.creator.name} - {self.user.username}'
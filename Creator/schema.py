@@ -1,10 +1,12 @@
 import graphene
 from graphene import ObjectType, String, Schema, List
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from Api import relay
+from Api.fields import ConnectionField
+from Api import objectcache
 from Common.types import SocialLinkInput, ImageInput
 from Creator.models import Creator, CreatorFollower
+from Content import timeline
 from Creator.types import CreatorFollowedObject, CreatorNotificationEnum
 from User.Utils.tools import ImageHandler
 from Common.schema import ImageObject
@@ -123,6 +125,7 @@ class FollowCreator(graphene.Mutation):
             return FollowCreator(creator=creator)
         new_follower = CreatorFollower(creator=creator, user=user, notifications=notifications.value)
         new_follower.save()
+        timeline.backfill(user, [creator.pk])
         return FollowCreator(creator=creator)
 
 
@@ -141,18 +144,18 @@ class UnfollowCreator(graphene.Mutation):
         if not is_following.exists():
             raise Exception('You are not following this creator')
         is_following.delete()
+        timeline.remove(user, creator)
         return UnfollowCreator(creator=creator)
 
 class Query(ObjectType):
-    Creators = DjangoFilterConnectionField(CreatorObject)
+    Creators = ConnectionField(CreatorObject)
     Creator = graphene.Field(CreatorObject, name=String(), handle=String())
     CreatorFollowers = List(CreatorFollowerType)
 
     def resolve_Creator(self, info, key=None, handle=None):
         if not key and not handle:
             raise Exception('Please provide either key or handle')
-        c = Creator.objects.get(key=key) if key else Creator.objects.get(handle=handle)
-        return c
+        return objectcache.get(Creator, key=key) if key else objectcache.get(Creator, handle=handle)
 
     def resolve_CreatorFollowers(self, info):
         return CreatorFollower.objects.all()
@@ -1,3 +1,39 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from Api.schema import schema
+from Common.models import Image
+from Creator.models import Creator
+from User.models import User
+
+CREATORS = '''
+query($first: Int) {
+  Creators(first: $first) {
+    edges { node { name image { url } banner { url } user { username image { url } } } }
+  }
+}
+'''
+
+
+class CreatorsQueriesTest(TestCase):
+    """Creators runs the same number of queries whatever the size of the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(12):
+            images = [Image(url=f'https://example.com/{index}-{kind}.png') for kind in ('user', 'creator', 'banner')]
+            for image in images:
+                image.save()
+            user = User.objects.create_user(email=f'user{index}@example.com', username=f'user{index}', password='password')
+            user.image = images[0]
+            user.save()
+            Creator(name=f'Creator {index}', handle=f'creator{index}', user=user, image=images[1], banner=images[2]).save()
+
+    def test_creators(self):
+        for first in (2, 10):
+            request = RequestFactory().post('/api/')
+            request.user = AnonymousUser()
+            with self.subTest(first=first), self.assertNumQueries(2):
+                result = schema.execute(CREATORS, variables={'first': first}, context_value=request)
+            self.assertIsNone(result.errors)
+            self.assertEqual(len(result.data['Creators']['edges']), first)
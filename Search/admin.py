@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import SearchDocument
+
+# Register your models here.
+
+@admin.register(SearchDocument)
+class SearchDocumentModel(admin.ModelAdmin):
+    pass
@@ -0,0 +1,151 @@
+import math
+import re
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Max, Q, Sum, Value, When
+from django.utils.html import escape
+
+from Content.models import Story
+from Content.text import plain_text
+from Content.timeline import is_visible
+from Search.models import SearchDocument, SearchPosting
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with'.split()
+)
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+# Field boosts, and the BM25 saturation and length normalization constants.
+BOOSTS = {'title': 3.0, 'tags': 2.0, 'description': 1.5, 'body': 1.0}
+K1 = 1.2
+B = 0.75
+AVERAGE_LENGTH = 400
+SNIPPET_LENGTH = 160
+
+
+def tokenize(text):
+    '''Lowercased word terms of `text`, without stop words'''
+    return [
+        token[:MAX_TERM_LENGTH] for token in TOKEN.findall((text or '').lower())
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def document_fields(item):
+    tags = ' '.join(tag.name for tag in item.tags.all())
+    if isinstance(item, Story):
+        return {'title': item.title, 'tags': tags, 'description': item.description, 'body': plain_text(item.content)}
+    return {'title': '', 'tags': tags, 'description': '', 'body': item.text or ''}
+
+
+def index(item):
+    '''Add, refresh or drop the SearchDocument of a Story or Post'''
+    target = {'story': item} if isinstance(item, Story) else {'post': item}
+    if not is_visible(item):
+        SearchDocument.objects.filter(**target).delete()
+        return None
+
+    fields = document_fields(item)
+    frequencies = Counter()
+    length = 0
+    for name, text in fields.items():
+        tokens = tokenize(text)
+        length += len(tokens)
+        for token in tokens:
+            frequencies[token] += BOOSTS[name]
+    norm = K1 * (1 - B + B * length / AVERAGE_LENGTH)
+
+    with transaction.atomic():
+        document, _ = SearchDocument.objects.update_or_create(**target, defaults={
+            'title': fields['title'][:255],
+            'body': fields['body'] or fields['description'] or '',
+            'length': length,
+            'published_at': item.published_at,
+        })
+        document.postings.all().delete()
+        SearchPosting.objects.bulk_create([
+            SearchPosting(document=document, term=term, weight=frequency * (K1 + 1) / (frequency + norm))
+            for term, frequency in frequencies.items()
+        ], batch_size=1000)
+    return document
+
+
+def query_conditions(tokens):
+    '''Exact match for every term but the last, which matches as a prefix'''
+    return [Q(term=token) for token in tokens[:-1]] + [Q(term__startswith=tokens[-1])]
+
+
+def search(query, kind=None, first=20, offset=0):
+    '''Rank documents matching every term of `query`, returns (total, hits)
+    where each hit is a (document, score) pair'''
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not tokens:
+        return 0, []
+    conditions = query_conditions(tokens)
+    postings = SearchPosting.objects.all()
+    documents = SearchDocument.objects.all()
+    if kind:
+        postings = postings.filter(**{f'document__{kind}__isnull': False})
+        documents = documents.filter(**{f'{kind}__isnull': False})
+
+    total_documents = documents.count() or 1
+    idfs = []
+    for condition in conditions:
+        frequency = postings.filter(condition).values('document').distinct().count()
+        idfs.append(math.log(1 + (total_documents - frequency + 0.5) / (frequency + 0.5)))
+
+    matched = reduce(lambda a, b: a + b, [
+        Max(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for condition in conditions
+    ])
+    score = Sum(Case(
+        *[When(condition, then=F('weight') * idf) for condition, idf in zip(conditions, idfs)],
+        default=Value(0.0), output_field=FloatField(),
+    ))
+    ranked = (postings.filter(reduce(or_, conditions)).values('document')
+              .annotate(matched=matched, score=score).filter(matched=len(conditions))
+              .order_by('-score', '-document'))
+    total = ranked.count()
+    page = list(ranked[offset:offset + first])
+    loaded = SearchDocument.objects.select_related('story', 'post').in_bulk([row['document'] for row in page])
+    hits = [(loaded[row['document']], row['score']) for row in page if row['document'] in loaded]
+    return total, hits
+
+
+def highlight_pattern(query):
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not tokens:
+        return None
+    return re.compile(r'\b(' + '|'.join(re.escape(token) for token in tokens) + r')\w*', re.IGNORECASE | re.UNICODE)
+
+
+def highlight(text, pattern):
+    '''Escape `text` and wrap the matched terms in <mark>'''
+    if not text or pattern is None:
+        return escape(text or '')
+    parts, last = [], 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(f'<mark>{escape(match.group(0))}</mark>')
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return ''.join(parts)
+
+
+def snippet(text, pattern, length=SNIPPET_LENGTH):
+    '''A window of `text` around the first match, highlighted'''
+    text = ' '.join((text or '').split())
+    match = pattern.search(text) if pattern else None
+    start = max(0, match.start() - length // 4) if match else 0
+    if start:
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < (match.start() if match else start + 1) else start
+    end = min(len(text), start + length)
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+    return ('…' if start else '') + highlight(text[start:end], pattern) + ('…' if end < len(text) else '')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Content.models import Story, Post
+from Search.index import index
+from Search.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index of every Story and Post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--clear', action='store_true', help='Drop the whole index first.')
+
+    def handle(self, *args, batch_size, clear, **options):
+        if clear:
+            SearchDocument.objects.all().delete()
+        for model in (Story, Post):
+            indexed = 0
+            items = model.objects.prefetch_related('tags').order_by('pk')
+            for item in items.iterator(chunk_size=batch_size):
+                if index(item) is not None:
+                    indexed += 1
+            self.stdout.write(f'{model._meta.label}: {indexed} indexed')
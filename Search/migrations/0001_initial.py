@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('Content', '0014_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.CharField(editable=False, max_length=40, primary_key=True, serialize=False, unique=True)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('length', models.PositiveIntegerField(default=0)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('post', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='Content.post')),
+                ('story', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='Content.story')),
+            ],
+            options={
+                'verbose_name': 'search document',
+                'verbose_name_plural': 'search documents',
+                'db_table': 'search_documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='Search.searchdocument')),
+            ],
+            options={
+                'verbose_name': 'search posting',
+                'verbose_name_plural': 'search postings',
+                'db_table': 'search_postings',
+                'indexes': [models.Index(fields=['term', 'document'], name='search_postings_term_idx')],
+                'constraints': [models.UniqueConstraint(fields=('document', 'term'), name='search_postings_document_term_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import models
+from nanoid import generate
+
+# Create your models here.
+
+class SearchDocument(models.Model):
+    '''The searchable text of one published Story or Post'''
+    id = models.CharField(max_length=40, unique=True, editable=False, primary_key=True)
+    story = models.OneToOneField('Content.Story', on_delete=models.CASCADE, null=True, blank=True, related_name='search_document')
+    post = models.OneToOneField('Content.Post', on_delete=models.CASCADE, null=True, blank=True, related_name='search_document')
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    length = models.PositiveIntegerField(default=0)
+    published_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'search_documents'
+        verbose_name = 'search document'
+        verbose_name_plural = 'search documents'
+
+    def __str__(self):
+        return self.title or self.id
+
+    def save(self, *args, **kwargs):
+        if not self.pk:
+            self.id = generate(size=40)
+        super().save(*args, **kwargs)
+        return self
+
+
+class SearchPosting(models.Model):
+    '''One term of a SearchDocument and its field-weighted frequency'''
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='postings')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    class Meta:
+        db_table = 'search_postings'
+        verbose_name = 'search posting'
+        verbose_name_plural = 'search postings'
+        indexes = [
+            models.Index(fields=['term', 'document'], name='search_postings_term_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'term'], name='search_postings_document_term_uniq'),
+        ]
+
+    def __str__(self):
+        return self.term
@@ -0,0 +1,54 @@
+import graphene
+
+from Api.loaders import get_loaders
+from Content.models import Story, Post
+from Content.schema import StoryObject, PostObject
+from Search.index import search, highlight, highlight_pattern, snippet
+
+MAX_RESULTS = 100
+
+
+class SearchTypeEnum(graphene.Enum):
+    '''Kind of content to search'''
+    STORY = 'story'
+    POST = 'post'
+
+
+class SearchHitObject(graphene.ObjectType):
+    score = graphene.Float()
+    title = graphene.String(description='Title with the matched terms wrapped in <mark>')
+    snippet = graphene.String(description='Excerpt around the first match, with the matched terms wrapped in <mark>')
+    story = graphene.Field(StoryObject)
+    post = graphene.Field(PostObject)
+
+
+class SearchResultsObject(graphene.ObjectType):
+    total = graphene.Int()
+    hits = graphene.List(SearchHitObject)
+
+
+class Query(graphene.ObjectType):
+    Search = graphene.Field(
+        SearchResultsObject,
+        query=graphene.String(required=True),
+        type=SearchTypeEnum(),
+        first=graphene.Int(default_value=20),
+        offset=graphene.Int(default_value=0),
+    )
+
+    def resolve_Search(self, info, query, type=None, first=20, offset=0):
+        if first > MAX_RESULTS: raise Exception(f'At most {MAX_RESULTS} results can be requested.')
+        total, hits = search(query, kind=type.value if type else None, first=max(first, 0), offset=max(offset, 0))
+        pattern = highlight_pattern(query)
+        loaders = get_loaders(info)
+        loaders.queue(Story, [document.story_id for document, _ in hits if document.story_id])
+        loaders.queue(Post, [document.post_id for document, _ in hits if document.post_id])
+        return SearchResultsObject(total=total, hits=[
+            SearchHitObject(
+                score=score,
+                title=highlight(document.title, pattern),
+                snippet=snippet(document.body, pattern),
+                story=document.story,
+                post=document.post,
+            ) for document, score in hits
+        ])
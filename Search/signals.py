@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from Content.models import Story, Post
+from Search.index import index
+
+
+@receiver(post_save, sender=Story)
+@receiver(post_save, sender=Post)
+def index_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: index(instance))
+
+
+@receiver(m2m_changed, sender=Story.tags.through)
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_on_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: index(instance))
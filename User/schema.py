@@ -2,8 +2,9 @@
 from graphene import ObjectType, List, Field, Int, String, relay as gRelay, Boolean
 import graphene
 from graphene_django.types import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from Api import relay
+from Api.fields import ConnectionField
+from Api import objectcache
 from Common.types import ImageInput
 from User.Utils.tools import ImageHandler
 from User.types import LoginObject
@@ -116,15 +117,14 @@ class Mutation(ObjectType):
     update_me = UpdateUser.Field()
 
 class Query(ObjectType):
-    Users = DjangoFilterConnectionField(UserObject)
+    Users = ConnectionField(UserObject)
     User = Field(UserType, username=String(), key=String())
     Me = Field(UserType)
 
     def resolve_User(self, info, username=None, key=None):
         if not username and not key:
             raise Exception('Please provide either username or id')
-        u = User.objects.get(username=username) if username else User.objects.get(key=key)
-        return u
+        return objectcache.get(User, username=username) if username else objectcache.get(User, key=key)
     
     def resolve_Me(self, info):
         user = info.context.user
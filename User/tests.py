@@ -1,3 +1,36 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from Api.schema import schema
+from Common.models import Image
+from User.models import User
+
+USERS = '''
+query($first: Int) {
+  Users(first: $first) {
+    edges { node { username name image { url } } }
+  }
+}
+'''
+
+
+class UsersQueriesTest(TestCase):
+    """Users runs the same number of queries whatever the size of the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(12):
+            image = Image(url=f'https://example.com/{index}.png')
+            image.save()
+            user = User.objects.create_user(email=f'user{index}@example.com', username=f'user{index}', password='password')
+            user.image = image
+            user.save()
+
+    def test_users(self):
+        for first in (2, 10):
+            request = RequestFactory().post('/api/')
+            request.user = AnonymousUser()
+            with self.subTest(first=first), self.assertNumQueries(2):
+                result = schema.execute(USERS, variables={'first': first}, context_value=request)
+            self.assertIsNone(result.errors)
+            self.assertEqual(len(result.data['Users']['edges']), first)
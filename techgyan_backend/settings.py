@@ -49,12 +49,126 @@ GRAPHENE = {
     'RELAY_CONNECTION_ENFORCE_OFFSET': False,
 }
 
+# Serve /api/ with Api.graphql.AsyncGraphQl, resolving the root fields of
+# queries concurrently in a pool of WORKERS threads. Only worth it under ASGI.
+GRAPHQL_ASYNC = {
+    'ENABLED': True,
+    'WORKERS': 8,
+}
+
+# Queries are rejected before execution when they may return more than
+# MAX_COST objects or nest deeper than MAX_DEPTH, see Api.cost. Lists that
+# are not connections count as LIST_SIZE objects. With THROTTLE_RATE set,
+# each user or IP may spend that much cost per THROTTLE_WINDOW seconds.
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': 20000,
+    'MAX_DEPTH': 12,
+    'LIST_SIZE': 20,
+    'THROTTLE_RATE': None,
+    'THROTTLE_WINDOW': 60,
+}
+
+# Resolver timing and SQL counts, see Api.profiling. Requests sending HEADER
+# get the profile in extensions.profile (DEBUG or staff users only);
+# SAMPLE_RATE of the rest feed the per-field histograms. Statements a field
+# runs once per parent for N_PLUS_ONE_THRESHOLD parents are logged as N+1.
+GRAPHQL_PROFILING = {
+    'HEADER': 'X-GraphQL-Profile',
+    'SAMPLE_RATE': 0.01,
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
+# /metrics serves Prometheus metrics, see Api.metrics. When set, scrapers
+# must send `Authorization: Bearer <METRICS_TOKEN>`.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Cached Story, Post, Creator and User lookups, see Api.objectcache. Entries
+# live for TIMEOUT seconds; on a miss other requests wait up to WAIT seconds
+# for the one loading it. Only enable it with a cache shared by every worker
+# process: with the default per-process local-memory cache, writes in one
+# worker do not invalidate the entries of the others.
+OBJECT_CACHE = {
+    'ENABLED': False,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCK_TIMEOUT': 5,
+    'WAIT': 0.5,
+}
+
+# Responses to anonymous GET queries are cached for TIMEOUT seconds and sent
+# with an ETag and `Cache-Control: public, max-age=MAX_AGE`, see
+# Api.responsecache. Queries selecting PRIVATE_FIELDS are never cached.
+GRAPHQL_RESPONSE_CACHE = {
+    'ENABLED': False,
+    'ALIAS': 'default',
+    'TIMEOUT': 60,
+    'MAX_AGE': 30,
+    'PRIVATE_FIELDS': ('clappedByMe', 'savedByMe', 'myVote', 'followed', 'MySavedStories', 'HomeFeed', 'Me'),
+}
+
+# Encoding of /api/ responses, see Api.encoding. OrjsonEncoder needs the
+# optional orjson package and falls back to json without it. With STREAM,
+# responses holding a list of STREAM_MIN_ITEMS or more items are sent in
+# CHUNK_SIZE chunks as they are encoded.
+GRAPHQL_JSON = {
+    'ENCODER': 'Api.encoding.OrjsonEncoder',
+    'STREAM': False,
+    'STREAM_MIN_ITEMS': 100,
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+# Number of parsed and validated query documents kept per process.
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+
+# Automatic persisted queries, STORE is one of Api.persisted.MemoryQueryStore,
+# Api.persisted.CacheQueryStore or Api.persisted.DatabaseQueryStore.
+GRAPHQL_PERSISTED_QUERIES = {
+    'STORE': 'Api.persisted.CacheQueryStore',
+    'OPTIONS': {'alias': 'default', 'timeout': 60 * 60 * 24},
+}
+
+# Home feed timelines. Creators with more followers than TIMELINE_FANOUT_LIMIT
+# are merged in when the feed is read instead of written to every follower.
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_MAX_AGE_DAYS = 90
+TIMELINE_MAX_ENTRIES = 1000
+
+# Trending scores, see Content.trending. Run update_trending periodically.
+TRENDING = {
+    'HALF_LIFE_HOURS': 24,
+    'WINDOW_DAYS': 7,
+    'WEIGHTS': {'clap': 1.0, 'comment': 3.0},
+}
+
+# Subscription broadcasts to the same group within this many seconds are
+# merged into one, see Api.broadcast.
+GRAPHQL_BROADCAST_WINDOW = 0.25
+
+# Queued broadcasts (Subscription.enqueue) are sent BATCH_SIZE at a time;
+# past MAX_QUEUE waiting events new ones are dropped.
+GRAPHQL_BROADCAST_BATCH = {'batch_size': 100, 'max_queue': 10000}
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND":  "channels.layers.InMemoryChannelLayer"
     },
 }
 
+# With several worker processes, run `manage.py runbroker` and point every
+# worker at it with CHANNEL_BROKER=host:port, see Api.layers.
+if os.environ.get('CHANNEL_BROKER'):
+    _broker_host, _, _broker_port = os.environ['CHANNEL_BROKER'].rpartition(':')
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'Api.layers.BrokerChannelLayer',
+        'CONFIG': {
+            'host': _broker_host or '127.0.0.1',
+            'port': int(_broker_port),
+            'capacity': 100,
+            'batch_interval': 0.002,
+            'compress_threshold': 1024,
+        },
+    }
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -71,6 +185,7 @@ INSTALLED_APPS = [
     'Common',
     'Creator',
     'Content',
+    'Search',
     'Api',
 ]
 
@@ -19,12 +19,16 @@ from django.urls import path
 from graphene_django.views import GraphQLView
 from Api.views import image_upload
 from django.conf import settings
-from Api.graphql import GraphQl
+from Api.graphql import AsyncGraphQl, GraphQl
+from Api.metrics import metrics_view
+
+GraphQlView = AsyncGraphQl if settings.GRAPHQL_ASYNC.get('ENABLED') else GraphQl
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', GraphQl.as_view(graphiql=True, pretty=True)),
-    path('image_upload', image_upload)
+    path('api/', GraphQlView.as_view(graphiql=True, pretty=settings.DEBUG)),
+    path('image_upload', image_upload),
+    path('metrics', metrics_view),
 ]
 
 if settings.DEBUG: